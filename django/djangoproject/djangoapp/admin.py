@@ -31,11 +31,12 @@ class ReportAdmin(admin.ModelAdmin):
     list_filter = ("reason", "resolved", "created_at")
     search_fields = ("user__username", "story_id", "description")
     readonly_fields = ("created_at",)
+    list_select_related = ("user",)
 
     actions = ["mark_as_resolved"]
 
     def mark_as_resolved(self, request, queryset):
-        queryset.update(resolved=True)
-        self.message_user(request, f"{queryset.count()} reports marked as resolved.")
+        updated = queryset.update(resolved=True)
+        self.message_user(request, f"{updated} reports marked as resolved.")
 
     mark_as_resolved.short_description = "Mark selected reports as resolved"
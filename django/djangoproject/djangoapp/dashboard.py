@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q, Sum
+
+from . import stats
+from .models import DailyPlayRollup, Play, Rating, Report
+
+# Author dashboard statistics
+# All of an author's stories are answered together: one grouped query per
+# table over story_id IN (...), never one query per story. Plays are read
+# from the daily rollups plus the raw plays not rolled up yet, so counts
+# stay exact after old plays are compacted.
+#
+# Results are cached per author for AUTHOR_DASHBOARD_CACHE_SECONDS. New
+# plays, ratings and reports call invalidate(story_id), which finds the
+# author through the story -> author entries stored with the cached stats.
+
+
+def _key(author_id):
+    return f"dashboard:{author_id}"
+
+
+def _story_key(story_id):
+    return f"dashboard:story:{story_id}"
+
+
+def author_stats(author_id, story_ids):
+    """{story_id: {"plays", "endings", "avg_rating", "rating_count",
+    "reports", "open_reports"}} for the author's stories"""
+    cached = cache.get(_key(author_id))
+    if cached is not None and cached.keys() >= set(story_ids):
+        return cached
+
+    result = story_stats(story_ids)
+    timeout = settings.AUTHOR_DASHBOARD_CACHE_SECONDS
+    cache.set(_key(author_id), result, timeout)
+    cache.set_many({_story_key(story_id): author_id for story_id in result}, timeout)
+    return result
+
+
+def invalidate(story_id):
+    """Drop the cached dashboard of the story's author, if there is one"""
+    author_id = cache.get(_story_key(story_id))
+    if author_id is not None:
+        cache.delete(_key(author_id))
+
+
+def story_stats(story_ids):
+    """Uncached author_stats() for any list of stories"""
+    result = {
+        story_id: {
+            "plays": 0,
+            "endings": {},
+            "avg_rating": None,
+            "rating_count": 0,
+            "reports": 0,
+            "open_reports": 0,
+        }
+        for story_id in story_ids
+    }
+    if not result:
+        return result
+
+    for story_id, ending_page_id, plays in _ending_counts(story_ids):
+        story = result[story_id]
+        story["plays"] += plays
+        story["endings"][ending_page_id] = (
+            story["endings"].get(ending_page_id, 0) + plays
+        )
+
+    ratings = (
+        Rating.objects.filter(story_id__in=story_ids)
+        .values_list("story_id")
+        .annotate(avg=Avg("rating"), n=Count("id"))
+    )
+    for story_id, avg, n in ratings:
+        result[story_id].update(avg_rating=avg, rating_count=n)
+
+    reports = (
+        Report.objects.filter(story_id__in=story_ids)
+        .values_list("story_id")
+        .annotate(n=Count("id"), open=Count("id", filter=Q(resolved=False)))
+    )
+    for story_id, n, open_reports in reports:
+        result[story_id].update(reports=n, open_reports=open_reports)
+
+    return result
+
+
+def _ending_counts(story_ids):
+    """(story_id, ending_page_id, plays) rows: rolled-up plays, then the rest"""
+    rolled_up = stats.get_watermark(stats.ROLLUP_WATERMARK_NAME).last_play_id
+    yield from (
+        DailyPlayRollup.objects.filter(story_id__in=story_ids)
+        .values_list("story_id", "ending_page_id")
+        .annotate(n=Sum("plays"))
+    )
+    yield from (
+        Play.objects.filter(story_id__in=story_ids, id__gt=rolled_up)
+        .values_list("story_id", "ending_page_id")
+        .annotate(n=Count("id"))
+    )
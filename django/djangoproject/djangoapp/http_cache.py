@@ -0,0 +1,87 @@
+import hashlib
+import json
+
+from django.contrib import messages
+from django.db.models import Count, Max, Sum
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+
+from .models import Play, Rating
+
+# HTTP caching for the public reader pages (story list + page view).
+# Anonymous responses are public and revalidated with their ETag,
+# so a caching proxy in front of Django can answer with 304s.
+# Authenticated responses contain the username, CSRF token and messages,
+# so they are private and always vary on the session cookie. So are
+# responses that (re)write the session, since they carry a Set-Cookie.
+
+
+def make_etag(*parts):
+    """Strong ETag built from any JSON-serialisable parts"""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode()
+    return '"%s"' % hashlib.sha1(payload).hexdigest()
+
+
+def activity_fingerprint():
+    """Latest Play/Rating activity used by the story list.
+
+    Changes on any new play, new rating or edited rating. There is no
+    matching Last-Modified: story edits happen in Flask and rating edits
+    leave created_at alone, so a timestamp would answer 304 for changed
+    lists. The story list's ETag covers both instead.
+    """
+    plays = Play.objects.aggregate(last_id=Max("id"))
+    ratings = Rating.objects.aggregate(
+        last_id=Max("id"), count=Count("id"), total=Sum("rating")
+    )
+    return [
+        plays["last_id"],
+        ratings["last_id"],
+        ratings["count"],
+        ratings["total"],
+    ]
+
+
+def is_cacheable(request):
+    """Only anonymous GET/HEAD requests without pending messages or session
+    changes are shared"""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if request.user.is_authenticated or request.session.modified:
+        return False
+    return len(messages.get_messages(request)) == 0
+
+
+def conditional_response(request, etag):
+    """Return a 304 response when the client copy is still fresh, else None"""
+    if not is_cacheable(request):
+        return None
+
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        patch_reader_headers(request, response, etag)
+    return response
+
+
+def patch_reader_headers(request, response, etag):
+    """Set Cache-Control / ETag / Vary on a reader response"""
+    patch_vary_headers(response, ("Cookie",))
+
+    if not is_cacheable(request):
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    if etag:
+        response["ETag"] = etag
+    return response
+
+
+def never_cache_response(response):
+    """Responses with side effects (e.g. a recorded Play) are never reused"""
+    patch_vary_headers(response, ("Cookie",))
+    patch_cache_control(response, private=True, no_store=True)
+    return response
@@ -0,0 +1,343 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from .models import StoryJob
+from .services import flask_api
+
+# Background story writes
+# Creating or editing a story is a long sequence of Flask calls. The views
+# store the submitted form as a StoryJob row and return straight away; the
+# job runs on a small in-process thread pool (STORY_JOBS_IN_PROCESS) or in
+# `manage.py run_jobs`, and the browser polls the job status.
+#
+# Claiming a job is a single conditional UPDATE (queued → running), so a
+# job is never run twice even when both the pool and run_jobs are active.
+# A job still running STORY_JOB_TIMEOUT seconds after it started lost its
+# worker (crash, kill -9, recycled worker): it is marked failed, not
+# requeued, since its first Flask writes may already have been made. A job
+# still queued STORY_JOB_SWEEP_INTERVAL seconds after it was submitted may
+# have been waiting in the pool of a worker that is gone: the in-process
+# pool adopts it (the conditional claim keeps that safe if it was not).
+# run_queued fails stale jobs before running the queue; in-process,
+# sweep_if_due runs the sweep at most once per interval per worker: on
+# worker start (gunicorn post_fork), on enqueue and while authors poll.
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_last_sweep = None  # time.monotonic() of this process's last sweep
+
+
+def enqueue(user, kind, form, story_id=None):
+    """Store a job for the submitted `form` (a QueryDict) and schedule it"""
+    payload = {
+        name: values
+        for name, values in form.lists()
+        if name != "csrfmiddlewaretoken"
+    }
+    job = StoryJob.objects.create(
+        user=user, kind=kind, payload=payload, story_id=story_id
+    )
+    if settings.STORY_JOBS_IN_PROCESS:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.id))
+        sweep_if_due()
+    return job
+
+
+def run_job(job_id):
+    """Claim and run one queued job; returns False if someone else claimed it"""
+    claimed = StoryJob.objects.filter(id=job_id, status="queued").update(
+        status="running", started_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    job = StoryJob.objects.get(id=job_id)
+    try:
+        with flask_api.acting_for(f"user:{job.user_id}"):
+            HANDLERS[job.kind](job, MultiValueDict(job.payload))
+    except Exception as e:  # recorded on the job, shown to the author
+        logger.exception("Story job %s failed", job.id)
+        job.status, job.error = "failed", str(e)
+    else:
+        job.status = "done"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "story_id", "finished_at"])
+    return True
+
+
+def run_queued(limit=None):
+    """Run queued jobs oldest first (used by `manage.py run_jobs`)"""
+    fail_stale()
+    ran = 0
+    queued = StoryJob.objects.filter(status="queued").order_by("id")
+    for job_id in queued.values_list("id", flat=True)[:limit]:
+        ran += run_job(job_id)
+    return ran
+
+
+def fail_stale():
+    """Mark jobs running for longer than STORY_JOB_TIMEOUT as failed"""
+    now = timezone.now()
+    stale = StoryJob.objects.filter(
+        status="running",
+        started_at__lt=now - timedelta(seconds=settings.STORY_JOB_TIMEOUT),
+    )
+    failed = stale.update(
+        status="failed",
+        error="Interrupted before it finished. Check the story and try again.",
+        finished_at=now,
+    )
+    if failed:
+        logger.warning("Marked %s interrupted story jobs as failed", failed)
+    return failed
+
+
+def sweep():
+    """Fail stale jobs; in-process, also adopt queued jobs no pool picked up"""
+    fail_stale()
+    if not settings.STORY_JOBS_IN_PROCESS:
+        return 0
+    cutoff = timezone.now() - timedelta(seconds=settings.STORY_JOB_SWEEP_INTERVAL)
+    orphans = list(
+        StoryJob.objects.filter(status="queued", created_at__lt=cutoff)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    for job_id in orphans:
+        _get_executor().submit(_run_in_thread, job_id)
+    if orphans:
+        logger.warning("Adopted %s queued story jobs", len(orphans))
+    return len(orphans)
+
+
+def sweep_if_due():
+    """sweep() unless this process ran it less than an interval ago"""
+    global _last_sweep
+    now = time.monotonic()
+    if (
+        _last_sweep is not None
+        and now - _last_sweep < settings.STORY_JOB_SWEEP_INTERVAL
+    ):
+        return
+    _last_sweep = now
+    sweep()
+
+
+def shutdown():
+    """Wait for running in-process jobs (worker shutdown)"""
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+
+
+def _get_executor():
+    # Created lazily so that preforking servers start the threads per worker
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.STORY_JOB_THREADS, thread_name_prefix="story-job"
+        )
+    return _executor
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+# ── Job handlers ────────────────────────────────────────────────────────────
+
+
+def create_story(job, form):
+    """Story, then its pages (first one is the start page), then choices"""
+    title = form.get("title")
+    description = form.get("description")
+
+    pages_data = form.getlist("page_text[]")
+    pages_ending = form.getlist("page_ending[]")
+    pages_ending_label = form.getlist("page_ending_label[]")
+
+    # 1. Create story in Flask (a draft until all its pages exist)
+    publish_immediately = form.get("publish_immediately") == "true"
+    result = flask_api.create_story(
+        title, description, status="draft", author_id=job.user_id
+    )
+    job.story_id = result["id"]
+    job.save(update_fields=["story_id"])
+
+    # 2. Create pages
+    page_ids = []
+    for i, page_text in enumerate(pages_data):
+        is_ending = str(i) in pages_ending
+        ending_label = pages_ending_label[i] if i < len(pages_ending_label) else None
+        is_start = i == 0  # First page is start page
+
+        page_result = flask_api.create_page(
+            job.story_id,
+            text=page_text,
+            is_ending=is_ending,
+            ending_label=ending_label if is_ending else None,
+            is_start_page=is_start,
+        )
+        page_ids.append(page_result["id"])
+
+    # 3. Create choices
+    for i, page_id in enumerate(page_ids):
+        choice_prefix = f"choice_{i}_"
+        choice_texts = form.getlist(f"{choice_prefix}text[]")
+        choice_targets = form.getlist(f"{choice_prefix}target[]")
+
+        for text, target in zip(choice_texts, choice_targets):
+            if text and target:  # Only create if both are filled
+                target_idx = int(target)
+                if target_idx < len(page_ids):
+                    flask_api.create_choice(
+                        page_id,
+                        text=text,
+                        next_page_id=page_ids[target_idx],
+                        story_id=job.story_id,
+                    )
+
+    # 4. Publishing freezes the snapshot readers see, now that all pages exist
+    if publish_immediately:
+        flask_api.update_story(
+            job.story_id, status="published", requesting_author_id=job.user_id
+        )
+
+
+def edit_story(job, form):
+    """Metadata, existing pages, deletions, choices, then new pages"""
+    story_id = job.story_id
+
+    # 1. Update story metadata. Publishing waits for the end (step 7), so
+    # the snapshot is frozen once, from the edited content
+    status = form.get("status")
+    publish = status == "published"
+    flask_api.update_story(
+        story_id,
+        title=form.get("title"),
+        description=form.get("description"),
+        status=None if publish else status,
+        requesting_author_id=job.user_id,
+    )
+
+    # 2. Update existing pages
+    existing_page_ids = form.getlist("existing_page_id[]")
+    existing_page_texts = form.getlist("existing_page_text[]")
+    existing_is_ending = form.getlist("existing_page_ending[]")
+    existing_ending_labels = form.getlist("existing_page_ending_label[]")
+
+    for i, page_id in enumerate(existing_page_ids):
+        is_ending = page_id in existing_is_ending
+        flask_api.update_page(
+            int(page_id),
+            text=existing_page_texts[i] if i < len(existing_page_texts) else "",
+            is_ending=is_ending,
+            ending_label=(
+                existing_ending_labels[i] if i < len(existing_ending_labels) else None
+            ),
+            story_id=story_id,
+        )
+
+    # 3. Delete removed pages
+    pages_to_delete = form.getlist("delete_page[]")
+    for page_id in pages_to_delete:
+        flask_api.delete_page(int(page_id), story_id=story_id)
+
+    # 4. Handle choices for existing pages
+    for page_id in existing_page_ids:
+        if page_id in pages_to_delete:
+            continue
+
+        # Delete removed choices
+        choices_to_delete = form.getlist(f"delete_choice_{page_id}[]")
+        for choice_id in choices_to_delete:
+            flask_api.delete_choice(int(page_id), int(choice_id), story_id=story_id)
+
+        # Update existing choices
+        choice_ids = form.getlist(f"choice_id_{page_id}[]")
+        choice_texts = form.getlist(f"choice_text_{page_id}[]")
+        choice_targets = form.getlist(f"choice_target_{page_id}[]")
+
+        for j, choice_id in enumerate(choice_ids):
+            if choice_id in choices_to_delete:
+                continue
+            if (
+                j < len(choice_texts)
+                and j < len(choice_targets)
+                and choice_texts[j]
+                and choice_targets[j]
+            ):
+                flask_api.update_choice(
+                    int(page_id),
+                    int(choice_id),
+                    text=choice_texts[j],
+                    next_page_id=int(choice_targets[j]),
+                    story_id=story_id,
+                )
+
+        # Add new choices for existing pages
+        new_choice_texts = form.getlist(f"new_choice_text_{page_id}[]")
+        new_choice_targets = form.getlist(f"new_choice_target_{page_id}[]")
+        for text, target in zip(new_choice_texts, new_choice_targets):
+            if text and target:
+                flask_api.create_choice(
+                    int(page_id),
+                    text=text,
+                    next_page_id=int(target),
+                    story_id=story_id,
+                )
+
+    # 5. Add new pages
+    new_page_texts = form.getlist("new_page_text[]")
+    new_page_endings = form.getlist("new_page_ending[]")
+    new_page_labels = form.getlist("new_page_ending_label[]")
+
+    new_page_ids = []
+    for i, text in enumerate(new_page_texts):
+        if not text.strip():
+            new_page_ids.append(None)
+            continue
+        is_ending = str(i) in new_page_endings
+        label = new_page_labels[i] if i < len(new_page_labels) else None
+        result = flask_api.create_page(
+            story_id,
+            text=text,
+            is_ending=is_ending,
+            ending_label=label if is_ending else None,
+        )
+        new_page_ids.append(result["id"])
+
+    # 6. Add choices for new pages
+    for i, new_pid in enumerate(new_page_ids):
+        if new_pid is None:
+            continue
+        new_choice_texts = form.getlist(f"new_page_choice_text_{i}[]")
+        new_choice_targets = form.getlist(f"new_page_choice_target_{i}[]")
+        for text, target in zip(new_choice_texts, new_choice_targets):
+            if text and target:
+                flask_api.create_choice(
+                    new_pid, text=text, next_page_id=int(target), story_id=story_id
+                )
+
+    # 7. (Re)publish so readers get the edited content
+    if publish:
+        flask_api.update_story(
+            story_id, status="published", requesting_author_id=job.user_id
+        )
+
+
+HANDLERS = {
+    "create_story": create_story,
+    "edit_story": edit_story,
+}
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoapp.paths import flush_expired
+from djangoapp.services.coalesce import cache_is_shared
+
+
+class Command(BaseCommand):
+    help = (
+        "Save buffered reading paths idle longer than READING_SESSION_TIMEOUT "
+        "as abandoned (run at least that often)"
+    )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError(
+                "Reading paths are buffered in the web workers' own memory: "
+                "configure a shared cache (REDIS_URL) to flush them from here."
+            )
+        saved = flush_expired()
+        self.stdout.write(self.style.SUCCESS(f"Saved {saved} idle reading paths."))
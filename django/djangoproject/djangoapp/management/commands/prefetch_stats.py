@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoapp.prefetch import metrics, reset_metrics
+from djangoapp.services.coalesce import cache_is_shared
+
+
+class Command(BaseCommand):
+    help = "Show next-page prefetch hit rates (to tune PAGE_PREFETCH_* settings)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters afterwards"
+        )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError(
+                "The counters live in the web workers' own memory: configure a "
+                "shared cache (REDIS_URL) to read them from here."
+            )
+        m = metrics()
+        self.stdout.write(
+            f"Pages shown:      {m['reads']}\n"
+            f"Prefetch hits:    {m['hits']} ({m['hit_rate']:.1%} of pages shown)\n"
+            f"Pages prefetched: {m['prefetched']} "
+            f"({m['precision']:.1%} were shown before expiring)\n"
+            f"Dropped (busy):   {m['dropped']}"
+        )
+        if options["reset"]:
+            reset_metrics()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
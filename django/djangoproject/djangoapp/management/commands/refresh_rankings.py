@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from djangoapp.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = (
+        "Update trending scores and 'readers also finished' recommendations "
+        "(run on a schedule, e.g. every 10 minutes)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild from the raw plays still kept instead of processing "
+            "only plays newer than the stored watermark",
+        )
+
+    def handle(self, *args, **options):
+        processed = refresh_rankings(full=options["full"])
+        mode = "full rebuild" if options["full"] else "incremental refresh"
+        self.stdout.write(
+            self.style.SUCCESS(f"Rankings {mode}: {processed} plays processed.")
+        )
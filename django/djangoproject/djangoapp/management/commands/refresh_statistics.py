@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from djangoapp.stats import refresh_play_stats
+
+
+class Command(BaseCommand):
+    help = "Refresh the materialized play statistics shown on /statistics/"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild the summary tables from scratch instead of "
+            "processing only plays newer than the stored watermark",
+        )
+
+    def handle(self, *args, **options):
+        processed = refresh_play_stats(full=options["full"])
+        mode = "full rebuild" if options["full"] else "incremental refresh"
+        self.stdout.write(
+            self.style.SUCCESS(f"Statistics {mode}: {processed} plays processed.")
+        )
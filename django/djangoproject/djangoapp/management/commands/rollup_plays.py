@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from djangoapp.stats import rollup_plays, compact_plays
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll new plays up into the hourly/daily time-series tables and "
+        "optionally compact old raw plays"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="Delete raw Play rows older than the retention window "
+            "once they are rolled up",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.PLAY_RETENTION_DAYS,
+            help="Days of raw plays to keep when compacting (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        processed = rollup_plays()
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} plays."))
+
+        if options["compact"]:
+            deleted = compact_plays(options["retention_days"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Compacted {deleted} plays older than "
+                    f"{options['retention_days']} days."
+                )
+            )
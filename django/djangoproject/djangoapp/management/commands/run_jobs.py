@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from djangoapp.jobs import run_queued
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background story jobs (create/edit). Use when "
+        "STORY_JOBS_IN_PROCESS is off, or to pick up jobs left by a restart. "
+        "Jobs running longer than STORY_JOB_TIMEOUT are marked failed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting when idle",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds between polls with --loop (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            ran = run_queued()
+            if ran:
+                self.stdout.write(self.style.SUCCESS(f"Ran {ran} jobs."))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0007_statistics_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPlayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('story_id', models.IntegerField()),
+                ('ending_page_id', models.IntegerField()),
+                ('plays', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily play rollups',
+                'abstract': False,
+                'unique_together': {('story_id', 'bucket_start', 'ending_page_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyPlayRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('story_id', models.IntegerField()),
+                ('ending_page_id', models.IntegerField()),
+                ('plays', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Hourly play rollups',
+                'abstract': False,
+                'unique_together': {('story_id', 'bucket_start', 'ending_page_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoapp", "0011_storyjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoryRanking",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("story_id", models.IntegerField(unique=True)),
+                ("decayed_plays", models.FloatField(default=0)),
+                ("rating", models.FloatField(blank=True, null=True)),
+                ("score", models.FloatField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StoryCooccurrence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("story_id", models.IntegerField()),
+                ("other_story_id", models.IntegerField()),
+                ("readers", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("story_id", "other_story_id")},
+            },
+        ),
+        migrations.CreateModel(
+            name="StoryRecommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("story_id", models.IntegerField()),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("recommended_story_id", models.IntegerField()),
+                ("share", models.FloatField()),
+            ],
+            options={
+                "unique_together": {("story_id", "rank")},
+            },
+        ),
+        migrations.CreateModel(
+            name="StoryReader",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("story_id", models.IntegerField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "story_id")},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangoapp", "0012_rankings"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="report",
+            name="story_id",
+            field=models.IntegerField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name="report",
+            index=models.Index(
+                condition=models.Q(("resolved", False)),
+                fields=["created_at", "id"],
+                name="report_open_queue_idx",
+            ),
+        ),
+    ]
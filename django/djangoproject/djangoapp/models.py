@@ -56,11 +56,219 @@ class Report(models.Model):
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    story_id = models.IntegerField()  # References Flask Story.id
+    story_id = models.IntegerField(db_index=True)  # References Flask Story.id
     reason = models.CharField(max_length=20, choices=REASON_CHOICES)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     resolved = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Moderation queue: open reports by time (keyset on created_at, id).
+            # Partial, since resolved=False is queried as NOT resolved, which
+            # SQLite can't look up in a (resolved, ...) index.
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(resolved=False),
+                name="report_open_queue_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Report by {self.user.username} on Story {self.story_id}"
+
+
+# Materialized statistics (filled by `manage.py refresh_statistics`)
+
+
+class StoryPlayStats(models.Model):
+    """Precomputed number of plays per story"""
+
+    story_id = models.IntegerField(unique=True)  # References Flask Story.id
+    total_plays = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Story play stats"
+
+    def __str__(self):
+        return f"Story {self.story_id}: {self.total_plays} plays"
+
+
+class EndingPlayStats(models.Model):
+    """Precomputed number of plays per (story, ending page)"""
+
+    story_id = models.IntegerField()  # References Flask Story.id
+    ending_page_id = models.IntegerField()  # References Flask Page.id
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ["story_id", "ending_page_id"]
+        verbose_name_plural = "Ending play stats"
+
+    def __str__(self):
+        return f"Story {self.story_id} → Ending {self.ending_page_id}: {self.count}"
+
+
+class StatsWatermark(models.Model):
+    """Highest Play.id already folded into a materialized table"""
+
+    name = models.CharField(max_length=50, unique=True)
+    last_play_id = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name}: up to Play {self.last_play_id}"
+
+
+class PlayRollup(models.Model):
+    """Plays per story and ending, bucketed by time (see rollup_plays command)"""
+
+    bucket_start = models.DateTimeField()
+    story_id = models.IntegerField()  # References Flask Story.id
+    ending_page_id = models.IntegerField()  # References Flask Page.id
+    plays = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        unique_together = ["story_id", "bucket_start", "ending_page_id"]
+
+    def __str__(self):
+        return (
+            f"Story {self.story_id} @ {self.bucket_start:%Y-%m-%d %H:%M} "
+            f"→ Ending {self.ending_page_id}: {self.plays}"
+        )
+
+
+class HourlyPlayRollup(PlayRollup):
+    class Meta(PlayRollup.Meta):
+        verbose_name_plural = "Hourly play rollups"
+
+
+class DailyPlayRollup(PlayRollup):
+    class Meta(PlayRollup.Meta):
+        verbose_name_plural = "Daily play rollups"
+
+
+class ReadingSession(models.Model):
+    """
+    One reader's path through a story.
+    The visited page ids are stored as a single delta-encoded varint array
+    (see djangoapp.paths) instead of one row per page view.
+    """
+
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    story_id = models.IntegerField(db_index=True)  # References Flask Story.id
+    path = models.BinaryField()
+    page_count = models.PositiveIntegerField(default=0)
+    ending_page_id = models.IntegerField(null=True, blank=True)  # None = abandoned
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+
+    def __str__(self):
+        outcome = f"Ending {self.ending_page_id}" if self.ending_page_id else "abandoned"
+        return f"Story {self.story_id}: {self.page_count} pages → {outcome}"
+
+
+class ReadingProgress(models.Model):
+    """Last page a signed-in reader saw in a story (for "resume reading")"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    story_id = models.IntegerField()  # References Flask Story.id
+    page_id = models.IntegerField()  # References Flask Page.id
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["user", "story_id"]  # One saved position per story
+
+    def __str__(self):
+        return f"{self.user.username}: Story {self.story_id} at Page {self.page_id}"
+
+
+class StoryJob(models.Model):
+    """Multi-step story write run in the background (see djangoapp.jobs)"""
+
+    KIND_CHOICES = [
+        ("create_story", "Create story"),
+        ("edit_story", "Edit story"),
+    ]
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    story_id = models.IntegerField(null=True, blank=True)  # Set once known
+    payload = models.JSONField()  # Submitted form fields: {name: [values]}
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default="queued", db_index=True
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.id} ({self.kind}) {self.status}"
+
+
+# Trending & recommendations (filled by `manage.py refresh_rankings`)
+
+
+class StoryRanking(models.Model):
+    """Trending score of a story: recent plays (decayed) × smoothed rating"""
+
+    story_id = models.IntegerField(unique=True)  # References Flask Story.id
+    decayed_plays = models.FloatField(default=0)  # As of the last refresh
+    rating = models.FloatField(null=True, blank=True)  # Bayesian average
+    score = models.FloatField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"Story {self.story_id}: {self.score:.2f}"
+
+
+class StoryReader(models.Model):
+    """A signed-in reader finished a story at least once"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    story_id = models.IntegerField()  # References Flask Story.id
+
+    class Meta:
+        unique_together = ["user", "story_id"]
+
+    def __str__(self):
+        return f"{self.user_id} finished Story {self.story_id}"
+
+
+class StoryCooccurrence(models.Model):
+    """Readers who finished both stories (stored both ways).
+
+    The row with story_id == other_story_id counts the story's readers.
+    """
+
+    story_id = models.IntegerField()  # References Flask Story.id
+    other_story_id = models.IntegerField()  # References Flask Story.id
+    readers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ["story_id", "other_story_id"]
+
+    def __str__(self):
+        return f"Story {self.story_id} & {self.other_story_id}: {self.readers}"
+
+
+class StoryRecommendation(models.Model):
+    """Top "readers also finished" stories for a story, by rank"""
+
+    story_id = models.IntegerField()  # References Flask Story.id
+    rank = models.PositiveSmallIntegerField()
+    recommended_story_id = models.IntegerField()  # References Flask Story.id
+    share = models.FloatField()  # Of the story's readers, those who finished it
+
+    class Meta:
+        unique_together = ["story_id", "rank"]
+
+    def __str__(self):
+        return f"Story {self.story_id} #{self.rank}: {self.recommended_story_id}"
@@ -0,0 +1,102 @@
+from datetime import datetime
+
+from django.db.models import Count, F, Max, Q, Window
+from django.db.models.functions import RowNumber
+
+from . import dashboard
+from .models import Report
+from .services import flask_api
+
+# Moderation queue
+# Open reports are shown grouped per story: one aggregate query returns a
+# page of stories with their report counts (total and per reason), newest
+# report first, and one more query their latest reports. Pages are keyset
+# paginated on (latest report time, story id): the cursor is the last row
+# shown, so every page costs the same however deep the moderator goes.
+#
+# Bulk actions work on story ids: resolving is one UPDATE, suspending is
+# one Flask call (PUT /stories/status) per STORIES_BATCH_MAX stories.
+
+PAGE_SIZE = 25
+REPORTS_PER_STORY = 3
+
+
+def story_groups(cursor=None, limit=PAGE_SIZE):
+    """(groups, next_cursor): a page of stories with open reports"""
+    reason_counts = {
+        reason: Count("id", filter=Q(reason=reason))
+        for reason, _ in Report.REASON_CHOICES
+    }
+    groups = (
+        Report.objects.filter(resolved=False)
+        .values("story_id")
+        .annotate(reports=Count("id"), latest=Max("created_at"), **reason_counts)
+        .order_by("-latest", "-story_id")
+    )
+    after = decode_cursor(cursor)
+    if after is not None:
+        latest, story_id = after
+        groups = groups.filter(
+            Q(latest__lt=latest) | Q(latest=latest, story_id__lt=story_id)
+        )
+
+    groups = list(groups[: limit + 1])
+    next_cursor = encode_cursor(groups[limit - 1]) if len(groups) > limit else None
+    groups = groups[:limit]
+    for group in groups:
+        group["reasons"] = [
+            (label, group[reason])
+            for reason, label in Report.REASON_CHOICES
+            if group[reason]
+        ]
+    return groups, next_cursor
+
+
+def latest_reports(story_ids, per_story=REPORTS_PER_STORY):
+    """{story_id: [Report]}: the newest open reports of each story"""
+    reports = (
+        Report.objects.filter(resolved=False, story_id__in=story_ids)
+        .select_related("user")
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F("story_id"),
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        .filter(position__lte=per_story)
+        .order_by("story_id", "position")
+    )
+    by_story = {}
+    for report in reports:
+        by_story.setdefault(report.story_id, []).append(report)
+    return by_story
+
+
+def resolve(story_ids):
+    """Resolve every open report of the stories; returns how many"""
+    resolved = Report.objects.filter(resolved=False, story_id__in=story_ids).update(
+        resolved=True
+    )
+    for story_id in story_ids:
+        dashboard.invalidate(story_id)
+    return resolved
+
+
+def suspend(story_ids):
+    """Suspend the stories and resolve their reports: (suspended ids, resolved)"""
+    suspended = flask_api.update_statuses(story_ids, "suspended")
+    return suspended, resolve(suspended)
+
+
+def encode_cursor(group):
+    return f"{group['latest'].isoformat()}_{group['story_id']}"
+
+
+def decode_cursor(cursor):
+    """(latest, story_id), or None for the first page / a malformed cursor"""
+    try:
+        latest, story_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(latest), int(story_id)
+    except (AttributeError, ValueError):
+        return None
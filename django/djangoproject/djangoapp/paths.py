@@ -0,0 +1,259 @@
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ReadingSession
+
+# Reader path tracking
+# Every page view appends the page id to the reader's buffer in the shared
+# cache (no database write). The session only holds the reader's random id,
+# written once, so later page views don't set a cookie. A buffer is
+# persisted as one ReadingSession row when the reader reaches an ending,
+# restarts the story, or stays away longer than READING_SESSION_TIMEOUT.
+#
+# Idle buffers are found by `manage.py flush_reading_paths`: each reader
+# registers once per READING_SESSION_TIMEOUT-long time bucket, and the
+# sweep visits the readers of buckets at least one full timeout old.
+# Readers also flush their own idle buffers on their next page view.
+#
+# A step is recorded only when the page changes: reloading (or
+# revalidating) the page the reader last saw, an ending included, adds
+# nothing.
+#
+# Paths are stored as zigzag + varint encoded deltas between consecutive
+# page ids: page ids of one story are close together, so most steps take
+# a single byte.
+
+SESSION_KEY = "reader"
+CACHE_PREFIX = "reading_paths:"
+SWEPT_KEY = f"{CACHE_PREFIX}swept"  # last time bucket swept
+BUFFER_TTL = 24 * 60 * 60  # unswept buffers are lost after this long
+
+
+# ── Encoding ────────────────────────────────────────────────────────────────
+
+
+def encode_path(page_ids):
+    """[12, 13, 15, 13] → compact bytes"""
+    out = bytearray()
+    previous = 0
+    for page_id in page_ids:
+        delta = page_id - previous
+        previous = page_id
+        value = delta * 2 if delta >= 0 else -delta * 2 - 1  # zigzag
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_path(data):
+    """Inverse of encode_path"""
+    page_ids = []
+    previous = 0
+    value = shift = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        delta = value >> 1 if not value & 1 else -((value + 1) >> 1)
+        previous += delta
+        page_ids.append(previous)
+        value = shift = 0
+    return page_ids
+
+
+# ── Buffers ─────────────────────────────────────────────────────────────────
+
+
+def record_page_view(request, story_id, page_id, is_ending=False):
+    """Buffer a page view; persist finished or timed out paths in one write"""
+    reader = request.session.get(SESSION_KEY)
+    if reader is None:
+        reader = request.session[SESSION_KEY] = uuid.uuid4().hex
+    entry = cache.get(_buffer_key(reader)) or {"bucket": None, "stories": {}}
+    if entry.get("last") == (story_id, page_id):
+        return
+    entry["last"] = (story_id, page_id)
+    buffers = entry["stories"]
+    now = time.time()
+    finished = _expired(buffers, now)
+
+    buffer = buffers.setdefault(
+        str(story_id), {"pages": [], "started": now, "last_seen": now}
+    )
+    buffer["pages"].append(page_id)
+    buffer["last_seen"] = now
+    buffer["user_id"] = request.user.id if request.user.is_authenticated else None
+
+    if is_ending or len(buffer["pages"]) >= settings.READING_SESSION_MAX_PAGES:
+        finished.append(
+            (story_id, buffers.pop(str(story_id)), page_id if is_ending else None)
+        )
+    finished += _over_total(buffers)
+
+    if entry["bucket"] != _bucket(now):
+        entry["bucket"] = _bucket(now)
+        _register(reader, entry["bucket"])
+    _save(reader, entry)
+    _persist(finished)
+
+
+def restart_story(request, story_id):
+    """Flush the current path for `story_id` as abandoned before a restart"""
+    reader = request.session.get(SESSION_KEY)
+    entry = cache.get(_buffer_key(reader)) if reader else None
+    if entry is None:
+        return
+    buffer = entry["stories"].pop(str(story_id), None)
+    entry.pop("last", None)  # the new path may begin on the page last seen
+    _save(reader, entry)
+    if buffer is not None:
+        _persist([(story_id, buffer, None)])
+
+
+def flush_expired():
+    """Persist every buffered path idle for READING_SESSION_TIMEOUT or more.
+
+    Returns the number of paths saved. Run it from one place (cron).
+    """
+    now = time.time()
+    swept = cache.get(SWEPT_KEY)
+    if swept is None:
+        swept = _bucket(now - BUFFER_TTL)
+    # Readers seen in the last two buckets may not have timed out yet
+    last = _bucket(now) - 2
+
+    finished = []
+    for bucket in range(swept + 1, last + 1):
+        count_key = f"{CACHE_PREFIX}bucket:{bucket}"
+        reader_keys = [
+            f"{count_key}:{n}" for n in range(1, cache.get(count_key, 0) + 1)
+        ]
+        for reader in set(cache.get_many(reader_keys).values()):
+            entry = cache.get(_buffer_key(reader))
+            if entry is None:
+                continue
+            expired = _expired(entry["stories"], now)
+            if expired:
+                _save(reader, entry)
+                finished += expired
+        cache.delete_many([count_key, *reader_keys])
+        cache.set(SWEPT_KEY, bucket, None)
+
+    _persist(finished)
+    return len(finished)
+
+
+def _expired(buffers, now):
+    """Pop the buffers idle longer than READING_SESSION_TIMEOUT (abandoned)"""
+    finished = []
+    for key, buffer in list(buffers.items()):
+        if now - buffer["last_seen"] > settings.READING_SESSION_TIMEOUT:
+            finished.append((int(key), buffers.pop(key), None))
+    return finished
+
+
+def _over_total(buffers):
+    """Pop the least recently read buffers beyond READING_SESSION_MAX_TOTAL_PAGES"""
+    finished = []
+    total = sum(len(buffer["pages"]) for buffer in buffers.values())
+    by_age = sorted(buffers, key=lambda key: buffers[key]["last_seen"])
+    while total > settings.READING_SESSION_MAX_TOTAL_PAGES:
+        key = by_age.pop(0)
+        buffer = buffers.pop(key)
+        total -= len(buffer["pages"])
+        finished.append((int(key), buffer, None))
+    return finished
+
+
+def _bucket(ts):
+    return int(ts // settings.READING_SESSION_TIMEOUT)
+
+
+def _buffer_key(reader):
+    return f"{CACHE_PREFIX}{reader}"
+
+
+def _register(reader, bucket):
+    """Add the reader to the bucket's list for flush_expired()"""
+    count_key = f"{CACHE_PREFIX}bucket:{bucket}"
+    cache.add(count_key, 0, BUFFER_TTL)
+    cache.set(f"{count_key}:{cache.incr(count_key)}", reader, BUFFER_TTL)
+
+
+def _save(reader, entry):
+    # Kept without buffers too: "last" still tells a reload from a new step
+    if entry["stories"] or entry.get("last"):
+        cache.set(_buffer_key(reader), entry, BUFFER_TTL)
+    else:
+        cache.delete(_buffer_key(reader))
+
+
+def _persist(finished):
+    if not finished:
+        return
+    ReadingSession.objects.bulk_create(
+        [
+            ReadingSession(
+                user_id=buffer["user_id"],
+                story_id=story_id,
+                path=encode_path(buffer["pages"]),
+                page_count=len(buffer["pages"]),
+                ending_page_id=ending_page_id,
+                started_at=_from_timestamp(buffer["started"]),
+                ended_at=_from_timestamp(buffer["last_seen"]),
+            )
+            for story_id, buffer, ending_page_id in finished
+        ]
+    )
+
+
+def _from_timestamp(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+
+# ── Funnel analysis ─────────────────────────────────────────────────────────
+
+
+def story_funnel(story_id):
+    """Per-page reach and drop-off rates for a story.
+
+    Streams every stored path once. A page counts at most once per session;
+    a drop-off is an abandoned session whose last page was that page.
+    """
+    reached = Counter()
+    dropped = Counter()
+    sessions = 0
+
+    rows = ReadingSession.objects.filter(story_id=story_id).values_list(
+        "path", "ending_page_id"
+    )
+    for path, ending_page_id in rows.iterator(chunk_size=2000):
+        page_ids = decode_path(path)
+        if not page_ids:
+            continue
+        sessions += 1
+        reached.update(set(page_ids))
+        if ending_page_id is None:
+            dropped[page_ids[-1]] += 1
+
+    return {
+        "story_id": story_id,
+        "sessions": sessions,
+        "pages": [
+            {
+                "page_id": page_id,
+                "reached": count,
+                "dropped": dropped[page_id],
+                "drop_off_rate": round(dropped[page_id] / count, 4),
+            }
+            for page_id, count in reached.most_common()
+        ],
+    }
@@ -0,0 +1,124 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from .services import flask_api
+
+# Next-page prefetching
+# After a page is shown, the pages its choices lead to are loaded into the
+# Flask read cache in one batch call (flask_api.warm_pages) on a small
+# background pool, so the reader's next click is served from cache.
+# PAGE_PREFETCH_DEPTH levels are followed; at most PAGE_PREFETCH_MAX_PENDING
+# prefetches wait for the pool, further ones are dropped.
+#
+# Metrics (counters in the shared cache, see `manage.py prefetch_stats`):
+#   reads       pages shown
+#   hits        pages shown that a prefetch had loaded
+#   prefetched  pages loaded by prefetches
+#   dropped     prefetches skipped because the pool was busy
+# Counters and warmed pages are only seen by other processes (other gunicorn
+# workers, the management command) when CACHES is shared, e.g. REDIS_URL.
+
+METRICS = ("reads", "hits", "prefetched", "dropped")
+MARKER_PREFIX = "prefetch:page:"
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def after_page_view(page):
+    """Count the read, then prefetch the pages this one links to"""
+    if not settings.PAGE_PREFETCH_DEPTH:
+        return
+    _count("reads")
+    if cache.delete(f"{MARKER_PREFIX}{page['id']}"):
+        _count("hits")
+
+    next_ids = _next_page_ids([page])
+    if not next_ids:
+        return
+
+    global _pending
+    with _lock:
+        busy = _pending >= settings.PAGE_PREFETCH_MAX_PENDING
+        if not busy:
+            _pending += 1
+    if busy:
+        _count("dropped")
+        return
+    _get_executor().submit(_prefetch, next_ids, page["story_id"])
+
+
+def metrics():
+    """{"reads", "hits", "prefetched", "dropped", "hit_rate", "precision"}"""
+    values = cache.get_many([f"prefetch:{name}" for name in METRICS])
+    counts = {name: values.get(f"prefetch:{name}", 0) for name in METRICS}
+    counts["hit_rate"] = counts["hits"] / counts["reads"] if counts["reads"] else 0
+    counts["precision"] = (
+        counts["hits"] / counts["prefetched"] if counts["prefetched"] else 0
+    )
+    return counts
+
+
+def reset_metrics():
+    cache.delete_many([f"prefetch:{name}" for name in METRICS])
+
+
+def _prefetch(page_ids, story_id):
+    global _pending
+    try:
+        for _ in range(settings.PAGE_PREFETCH_DEPTH):
+            pages = flask_api.warm_pages(page_ids, story_id)
+            if not pages:
+                break
+            cache.set_many(
+                {f"{MARKER_PREFIX}{page['id']}": 1 for page in pages},
+                settings.FLASK_API_CACHE_SECONDS,
+            )
+            _count("prefetched", len(pages))
+            page_ids = _next_page_ids(pages)
+            if not page_ids:
+                break
+    except requests.exceptions.RequestException as e:
+        logger.info("Page prefetch failed: %s", e)
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def _next_page_ids(pages):
+    return list(
+        dict.fromkeys(
+            choice["next_page_id"]
+            for page in pages
+            if not page.get("is_ending")
+            for choice in page.get("choices", [])
+        )
+    )
+
+
+def _count(name, n=1):
+    key = f"prefetch:{name}"
+    if not cache.add(key, n, None):  # not the first count since a reset
+        try:
+            cache.incr(key, n)
+        except ValueError:  # evicted in between
+            cache.add(key, n, None)
+
+
+def _get_executor():
+    # Created lazily so that preforking servers start the threads per worker
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PAGE_PREFETCH_THREADS,
+            thread_name_prefix="page-prefetch",
+        )
+    return _executor
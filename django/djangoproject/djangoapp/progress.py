@@ -0,0 +1,111 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import ReadingProgress
+
+# Saved reading positions ("resume where you left off")
+# Reads hit the shared cache first and fall back to one indexed lookup on
+# (user, story_id). Writes go to the cache immediately and are buffered
+# in-process, then flushed to the database in one bulk upsert once the
+# buffer is big enough or old enough. Cached positions expire after
+# READING_PROGRESS_CACHE_TIMEOUT, "nothing saved" after the much shorter
+# READING_PROGRESS_MISS_TIMEOUT, so the database stays the source of truth.
+
+NO_POSITION = 0  # cached marker for "nothing saved", avoids repeated DB misses
+
+_pending = {}  # (user_id, story_id) -> page_id, or None to delete
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _cache_key(user_id, story_id):
+    return f"progress:{user_id}:{story_id}"
+
+
+def get_position(user_id, story_id):
+    """Return the saved page id for this reader and story, or None"""
+    key = _cache_key(user_id, story_id)
+    page_id = cache.get(key)
+    if page_id is None:
+        with _lock:  # saved by this process but not flushed yet?
+            buffered = (user_id, story_id) in _pending
+            page_id = _pending.get((user_id, story_id))
+        if not buffered:
+            page_id = (
+                ReadingProgress.objects.filter(user_id=user_id, story_id=story_id)
+                .values_list("page_id", flat=True)
+                .first()
+            )
+        page_id = page_id or NO_POSITION
+        _cache_position(key, page_id)
+    return page_id or None
+
+
+def save_position(user_id, story_id, page_id):
+    """Remember the reader's current page (buffered write)"""
+    _cache_position(_cache_key(user_id, story_id), page_id)
+    _buffer(user_id, story_id, page_id)
+
+
+def clear_position(user_id, story_id):
+    """Forget the saved page once the reader finishes the story (buffered write)"""
+    _cache_position(_cache_key(user_id, story_id), NO_POSITION)
+    _buffer(user_id, story_id, None)
+
+
+def _cache_position(key, page_id):
+    if page_id == NO_POSITION:
+        timeout = settings.READING_PROGRESS_MISS_TIMEOUT
+    else:
+        timeout = settings.READING_PROGRESS_CACHE_TIMEOUT
+    cache.set(key, page_id, timeout)
+
+
+def _buffer(user_id, story_id, page_id):
+    with _lock:
+        _pending[(user_id, story_id)] = page_id
+        due = (
+            len(_pending) >= settings.READING_PROGRESS_FLUSH_SIZE
+            or time.monotonic() - _last_flush >= settings.READING_PROGRESS_FLUSH_INTERVAL
+        )
+    if due:
+        flush()
+
+
+def flush():
+    """Write all buffered positions: one bulk upsert plus one bulk delete"""
+    global _pending, _last_flush
+    with _lock:
+        batch, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    if not batch:
+        return
+
+    upserts = [
+        ReadingProgress(user_id=user_id, story_id=story_id, page_id=page_id)
+        for (user_id, story_id), page_id in batch.items()
+        if page_id is not None
+    ]
+    if upserts:
+        ReadingProgress.objects.bulk_create(
+            upserts,
+            update_conflicts=True,
+            unique_fields=["user", "story_id"],
+            update_fields=["page_id", "updated_at"],
+            batch_size=500,
+        )
+
+    finished = Q()
+    for (user_id, story_id), page_id in batch.items():
+        if page_id is None:
+            finished |= Q(user_id=user_id, story_id=story_id)
+    if finished:
+        ReadingProgress.objects.filter(finished).delete()
+
+
+atexit.register(flush)
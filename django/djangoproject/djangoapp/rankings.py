@@ -0,0 +1,216 @@
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import (
+    Play,
+    Rating,
+    StatsWatermark,
+    StoryRanking,
+    StoryReader,
+    StoryCooccurrence,
+    StoryRecommendation,
+)
+from .stats import merge_counts
+
+# Trending stories and "readers also finished" recommendations
+# Filled incrementally by `manage.py refresh_rankings` from the plays above
+# the "rankings" watermark, read with one indexed query when serving.
+#
+# Trending: every play counts exp(-age / tau) (half-life
+# TRENDING_HALF_LIFE_HOURS). Since decay is multiplicative, a refresh ages
+# the stored sums with one UPDATE and adds the new plays. The score is the
+# decayed plays times the Bayesian average rating
+# (prior * mean + sum) / (prior + n), so a few votes can't push a story up.
+#
+# Recommendations: StoryReader holds the distinct (reader, story) pairs —
+# the sparse reader x story matrix — and StoryCooccurrence its product,
+# only the non-zero pairs. New finishes add to the pairs they create, one
+# batch of BATCH_SIZE plays at a time, so memory is bounded by the batch,
+# not by the history. Each story keeps its STORY_RECOMMENDATIONS most
+# co-finished stories.
+
+WATERMARK_NAME = "rankings"
+BATCH_SIZE = 10000
+
+
+def refresh_rankings(full=False):
+    """Fold new plays into rankings and recommendations.
+
+    Returns the number of plays processed. A full rebuild starts over from
+    the raw plays still kept (compacted plays are gone).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        watermark, _ = StatsWatermark.objects.select_for_update().get_or_create(
+            name=WATERMARK_NAME
+        )
+        if full:
+            for model in (
+                StoryRanking,
+                StoryReader,
+                StoryCooccurrence,
+                StoryRecommendation,
+            ):
+                model.objects.all().delete()
+            watermark.last_play_id, watermark.refreshed_at = 0, None
+
+        if watermark.refreshed_at is not None:
+            StoryRanking.objects.update(
+                decayed_plays=F("decayed_plays") * _decay(now - watermark.refreshed_at)
+            )
+
+        high = Play.objects.aggregate(high=Max("id"))["high"] or 0
+        processed, changed = 0, set()
+        start = watermark.last_play_id
+        while start < high:
+            end = min(start + BATCH_SIZE, high)
+            plays = Play.objects.filter(id__gt=start, id__lte=end)
+            processed += _add_plays(plays, now)
+            changed |= _add_readers(plays)
+            start = end
+
+        _score()
+        _recommend(changed)
+
+        watermark.last_play_id = high
+        watermark.refreshed_at = now
+        watermark.save()
+
+    return processed
+
+
+def trending_scores(story_ids):
+    """{story_id: score} for the stories that have one"""
+    return dict(
+        StoryRanking.objects.filter(story_id__in=story_ids).values_list(
+            "story_id", "score"
+        )
+    )
+
+
+def recommendations(story_id):
+    """[(recommended_story_id, share)], best first"""
+    return list(
+        StoryRecommendation.objects.filter(story_id=story_id)
+        .order_by("rank")
+        .values_list("recommended_story_id", "share")
+    )
+
+
+def _decay(age):
+    tau = settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+    return math.exp(-max(age.total_seconds(), 0) / tau)
+
+
+def _add_plays(plays, now):
+    decayed = defaultdict(float)
+    count = 0
+    for story_id, created_at in plays.values_list("story_id", "created_at").iterator():
+        decayed[story_id] += _decay(now - created_at)
+        count += 1
+    merge_counts(StoryRanking, ("story_id",), "decayed_plays", decayed.items())
+    return count
+
+
+def _add_readers(plays):
+    """Record first finishes; returns the stories whose pairs changed"""
+    finished = defaultdict(set)
+    for user_id, story_id in (
+        plays.filter(user__isnull=False).values_list("user_id", "story_id").distinct()
+    ):
+        finished[user_id].add(story_id)
+    if not finished:
+        return set()
+
+    known = defaultdict(set)
+    for user_id, story_id in StoryReader.objects.filter(
+        user_id__in=list(finished)
+    ).values_list("user_id", "story_id"):
+        known[user_id].add(story_id)
+
+    readers, pairs = [], Counter()
+    for user_id, stories in finished.items():
+        new = stories - known[user_id]
+        for story_id in new:
+            readers.append(StoryReader(user_id=user_id, story_id=story_id))
+            pairs[story_id, story_id] += 1
+            for other in known[user_id]:
+                pairs[story_id, other] += 1
+                pairs[other, story_id] += 1
+            for other in new - {story_id}:
+                pairs[story_id, other] += 1  # (other, story_id) on its own turn
+        known[user_id] |= new
+
+    StoryReader.objects.bulk_create(readers, batch_size=500)
+    merge_counts(
+        StoryCooccurrence,
+        ("story_id", "other_story_id"),
+        "readers",
+        [(story_id, other, n) for (story_id, other), n in pairs.items()],
+    )
+    return {story_id for story_id, _ in pairs}
+
+
+def _score():
+    prior = settings.RANKING_RATING_PRIOR
+    mean = (
+        Rating.objects.aggregate(mean=Avg("rating"))["mean"]
+        or settings.RANKING_DEFAULT_RATING
+    )
+    ratings = {
+        story_id: (n, total)
+        for story_id, n, total in Rating.objects.values_list("story_id").annotate(
+            n=Count("id"), total=Sum("rating")
+        )
+    }
+
+    rankings = list(StoryRanking.objects.all())
+    for ranking in rankings:
+        n, total = ratings.get(ranking.story_id, (0, 0))
+        ranking.rating = (prior * mean + total) / (prior + n)
+        ranking.score = ranking.decayed_plays * ranking.rating
+    StoryRanking.objects.bulk_update(rankings, ["rating", "score"], batch_size=500)
+
+
+def _recommend(story_ids):
+    if not story_ids:
+        return
+    readers = dict(
+        StoryCooccurrence.objects.filter(
+            story_id__in=story_ids, other_story_id=F("story_id")
+        ).values_list("story_id", "readers")
+    )
+    # Top pairs of every changed story in one query (ROW_NUMBER per story)
+    top = (
+        StoryCooccurrence.objects.filter(story_id__in=story_ids)
+        .exclude(other_story_id=F("story_id"))
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F("story_id"),
+                order_by=[F("readers").desc(), F("other_story_id").asc()],
+            )
+        )
+        .filter(rank__lte=settings.STORY_RECOMMENDATIONS)
+        .values_list("story_id", "rank", "other_story_id", "readers")
+    )
+
+    StoryRecommendation.objects.filter(story_id__in=story_ids).delete()
+    StoryRecommendation.objects.bulk_create(
+        [
+            StoryRecommendation(
+                story_id=story_id,
+                rank=rank,
+                recommended_story_id=other,
+                share=n / readers[story_id],
+            )
+            for story_id, rank, other, n in top
+        ],
+        batch_size=500,
+    )
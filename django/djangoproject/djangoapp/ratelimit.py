@@ -0,0 +1,102 @@
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+# Token-bucket rate limiting for write views
+# Each (scope, client) pair has a bucket of `capacity` tokens refilled at
+# `per_second`; a request takes one token or gets a 429 with Retry-After.
+# Clients are signed-in users by id, anonymous ones by IP address: behind
+# RATE_LIMIT_TRUSTED_PROXIES reverse proxies, the address the outermost of
+# them saw (X-Forwarded-For), not the proxy's own. Limits are set per scope
+# in RATE_LIMITS.
+#
+# Buckets live in RATE_LIMIT_STORE, by default CacheStore: the shared
+# Django cache, so all workers draw from the same buckets. Read-modify-write
+# without a lock: concurrent requests may occasionally both get the last
+# token.
+
+
+class CacheStore:
+    """Buckets in the Django cache, shared by every worker"""
+
+    def take(self, key, capacity, per_second):
+        """Take a token: 0 if allowed, else seconds until one is available"""
+        cache_key = f"ratelimit:{key}"
+        now = time.time()
+        tokens, updated = cache.get(cache_key) or (capacity, now)
+        tokens, wait = _take(tokens, now - updated, capacity, per_second)
+        # Untouched for this long, the bucket is full again anyway
+        cache.set(cache_key, (tokens, now), math.ceil(capacity / per_second) + 1)
+        return wait
+
+
+def _take(tokens, elapsed, capacity, per_second):
+    tokens = min(capacity, tokens + max(elapsed, 0) * per_second)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / per_second
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.RATE_LIMIT_STORE)()
+    return _store
+
+
+def client_key(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.id}"
+    return f"ip:{client_ip(request)}"
+
+
+def client_ip(request):
+    """REMOTE_ADDR, or the client address our trusted proxies forwarded"""
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if proxies:
+        # Each proxy appends the address it received the request from;
+        # entries further left were sent by the client and can be forged
+        header = request.META.get("HTTP_X_FORWARDED_FOR", "")
+        forwarded = [address.strip() for address in header.split(",")]
+        if header and len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def rate_limit(scope, methods=("POST",)):
+    """View decorator: limit `methods` requests per client (RATE_LIMITS[scope])"""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                capacity, per_second = settings.RATE_LIMITS[scope]
+                wait = get_store().take(
+                    f"{scope}:{client_key(request)}", capacity, per_second
+                )
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def too_many_requests(wait):
+    seconds = math.ceil(wait)
+    response = HttpResponse(
+        f"Too many requests. Please try again in {seconds} seconds.",
+        status=429,
+        content_type="text/plain",
+    )
+    response["Retry-After"] = str(seconds)
+    return response
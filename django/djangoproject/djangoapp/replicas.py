@@ -0,0 +1,80 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Read replica routing
+# Reads go to the "replica" database (when one is configured) only inside
+# a read-only request; writes, management commands and everything outside
+# a request use the primary ("default").
+#
+# Read-your-writes: the first write of a request pins the rest of that
+# request to the primary, and the response sets a short-lived cookie so
+# the same reader's next requests (the redirect after a POST, ...) also
+# read from the primary until the replica has caught up. The pin is
+# forwarded to the Flask API as the X-Read-Primary header. Without a
+# replica there is nothing to pin, and the bookkeeping a read itself writes
+# (plays, reading progress and paths, sessions) never pins: the reader
+# does not read those rows back through the replica.
+
+REPLICA = "replica"
+PIN_COOKIE = "read_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+BOOKKEEPING = {
+    "djangoapp.Play",
+    "djangoapp.ReadingProgress",
+    "djangoapp.ReadingSession",
+    "sessions.Session",
+}
+
+_use_replica = ContextVar("use_replica", default=False)
+_wrote = ContextVar("wrote", default=False)
+
+
+def reads_pinned():
+    """True when reads in this context must see the primary"""
+    return not _use_replica.get()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        if REPLICA in settings.DATABASES and model._meta.label not in BOOKKEEPING:
+            _use_replica.set(False)
+            _wrote.set(True)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # same data on both sides
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"  # the replica follows the primary
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replica = request.method in SAFE_METHODS and not request.COOKIES.get(
+            PIN_COOKIE
+        )
+        replica_token = _use_replica.set(use_replica)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE,
+                    "1",
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True,
+                    samesite="Lax",
+                )
+            return response
+        finally:
+            _use_replica.reset(replica_token)
+            _wrote.reset(wrote_token)
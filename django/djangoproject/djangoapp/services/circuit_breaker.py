@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import deque
+
+import requests
+
+# Circuit breaker for the Flask API
+# Tracks the outcome of recent calls over a sliding time window. When the
+# failure rate crosses the threshold the circuit opens and calls fail
+# immediately (no socket, no timeout wait). After `reset_timeout` seconds a
+# single probe call is let through (half-open): success closes the circuit,
+# failure opens it again.
+#
+# State is per process, which is what we want: each gunicorn worker stops
+# hammering a dead Flask on its own.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling Flask while the circuit is open.
+
+    A ConnectionError, so views that already handle RequestException keep
+    working unchanged.
+    """
+
+
+class CircuitBreaker:
+    def __init__(self, failure_rate, min_calls, window, reset_timeout):
+        self.failure_rate = failure_rate  # 0..1, opens at or above this
+        self.min_calls = min_calls  # no verdict on fewer calls than this
+        self.window = window  # seconds of history considered
+        self.reset_timeout = reset_timeout  # seconds open before probing
+        self.state = CLOSED
+        self._calls = deque()  # (timestamp, ok)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless this call may go through"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Flask API circuit is open")
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError("Flask API circuit is half-open")
+                self._probing = True
+
+    def record(self, ok):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                self._calls.clear()
+                if ok:
+                    self.state = CLOSED
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, ok))
+            while self._calls and now - self._calls[0][0] > self.window:
+                self._calls.popleft()
+
+            failures = sum(1 for _, call_ok in self._calls if not call_ok)
+            if (
+                len(self._calls) >= self.min_calls
+                and failures / len(self._calls) >= self.failure_rate
+            ):
+                self._open(now)
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._calls.clear()
@@ -0,0 +1,112 @@
+import copy
+import math
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# Read-through cache with single-flight refreshes
+# Concurrent misses for the same key share one upstream call:
+# - threads of one process wait on the leader's Future;
+# - processes take a short cache lock (cache.add); the losers serve the
+#   value they still have, or wait briefly for the winner to store one.
+#
+# Entries are refreshed early with probability rising towards expiry
+# (XFetch: refresh when now - delta * beta * ln(rand) >= expiry, delta
+# being how long the last fetch took), so a hot key is renewed by one
+# caller ahead of time instead of by everyone at once when it expires.
+#
+# The locks, and the invalidation built on top (flask_api), only work
+# across processes with a shared cache (CACHES): see cache_is_shared().
+
+LOCK_POLL = 0.05  # seconds between checks while another worker fetches
+
+_inflight = {}  # key -> Future of the in-process leader
+_inflight_lock = threading.Lock()
+
+
+def get_or_fetch(key, fetch, ttl):
+    """Cached value for `key`, calling `fetch()` at most once per key at a time"""
+    entry = cache.get(key)
+    if entry is not None and not _refresh_early(entry):
+        return entry["value"]
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        if entry is not None:
+            return entry["value"]  # early refresh under way, current value is fine
+        return copy.deepcopy(future.result())  # callers may mutate what they get
+
+    try:
+        value = _fetch_with_lock(key, fetch, ttl, entry)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+def _fetch_with_lock(key, fetch, ttl, entry):
+    lock_key = f"{key}:lock"
+    locked = cache.add(lock_key, 1, settings.FLASK_API_LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return entry["value"]
+        deadline = time.monotonic() + settings.FLASK_API_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry["value"]
+        # The other worker is slow or gone: fetch without the lock
+
+    try:
+        started = time.monotonic()
+        value = fetch()
+        put_many({key: value}, ttl, delta=time.monotonic() - started)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def put_many(values, ttl, delta):
+    """Store {key: value} as entries get_or_fetch understands (cache warming).
+
+    `delta` is the time the fetch took, used for early refreshes.
+    """
+    expires = time.time() + ttl
+    cache.set_many(
+        {
+            key: {"value": value, "delta": delta, "expires": expires}
+            for key, value in values.items()
+        },
+        ttl,
+    )
+
+
+def _refresh_early(entry):
+    beta = settings.FLASK_API_XFETCH_BETA
+    return (
+        time.time() - entry["delta"] * beta * math.log(1.0 - random.random())
+        >= entry["expires"]
+    )
+
+
+def cache_is_shared():
+    """Whether every worker process sees the same default cache"""
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
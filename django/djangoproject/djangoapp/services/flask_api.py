@@ -1,66 +1,309 @@
+import logging
 import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlencode
+
 import requests
 from django.conf import settings
+from django.core.cache import cache
+from urllib3.util import make_headers
+
+from .. import replicas
+from . import coalesce
+from .circuit_breaker import CircuitBreaker
+
+try:
+    import msgpack
+except ImportError:  # optional: plain JSON responses
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json decoding
+    orjson = None
 
 BASE_URL = settings.FLASK_API_BASE_URL
 API_KEY = os.environ.get("FLASK_API_KEY", "Stories")
+MSGPACK_MIMETYPE = "application/msgpack"
+READ_GENERATION_KEY = "flask_read_generation"  # + ":<scope>", see _read_key
+PAGES_BATCH_MAX = 100  # Flask's PAGES_BATCH_MAX
+STORIES_BATCH_MAX = 100  # Flask's STORIES_BATCH_MAX
+
+logger = logging.getLogger(__name__)
+
+# One pooled session for all Flask calls (keep-alive connections).
+# Advertise every content-encoding urllib3 can decode (gzip, deflate, plus
+# br/zstd when those packages are installed); bodies are decoded
+# transparently before .content / .json() see them.
+session = requests.Session()
+session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)[
+    "accept-encoding"
+]
+
+# Fail fast while Flask is down (see circuit_breaker.py); reads fall back to
+# the last good response for up to FLASK_API_STALE_SECONDS
+breaker = CircuitBreaker(**settings.FLASK_API_CIRCUIT_BREAKER)
+
+# Who the writes are made for (X-Client-Id): Flask rate-limits each one
+# separately, so one author's large story job can't use up the writes of
+# everyone else's
+_client = ContextVar("flask_client", default=None)
+
+
+def _request(method, path, invalidates=(), **kwargs):
+    """Every Flask call: circuit breaker, timeouts, raise on HTTP errors.
+
+    Connection errors, timeouts and 5xx count as failures for the breaker;
+    4xx responses are the API working as intended. Rate-limited calls (429)
+    are retried up to FLASK_API_RATE_LIMIT_RETRIES times after the
+    Retry-After delay, if that is at most FLASK_API_RATE_LIMIT_MAX_WAIT.
+
+    A successful write drops the cached reads of the `invalidates` scopes
+    (every cached read when none are given).
+    """
+    for attempt in range(settings.FLASK_API_RATE_LIMIT_RETRIES + 1):
+        breaker.before_call()
+        try:
+            response = session.request(
+                method,
+                f"{BASE_URL}{path}",
+                timeout=settings.FLASK_API_TIMEOUT,
+                **kwargs,
+            )
+        except requests.exceptions.RequestException:
+            breaker.record(ok=False)
+            raise
+        breaker.record(ok=response.status_code < 500)
+
+        if response.status_code != 429:
+            break
+        wait = float(response.headers.get("Retry-After", 1))
+        if wait > settings.FLASK_API_RATE_LIMIT_MAX_WAIT:
+            break
+        time.sleep(wait)
+    response.raise_for_status()
+    if method != "get":
+        _invalidate_reads(*invalidates)
+    return response
 
 
 def get_headers():
     """Return headers with API key for write operations"""
-    return {"X-API-KEY": API_KEY}
+    headers = {"X-API-KEY": API_KEY}
+    if _client.get() is not None:
+        headers["X-Client-Id"] = _client.get()
+    return headers
+
+
+@contextmanager
+def acting_for(client):
+    """Send the writes made inside the block on behalf of `client`"""
+    token = _client.set(client)
+    try:
+        yield
+    finally:
+        _client.reset(token)
 
 
 # READ OPERATIONS (no API key needed)
 
 
+def read_headers():
+    """Ask for MessagePack when msgpack is installed (JSON otherwise), and
+    for primary reads while this reader's own writes may not be replicated"""
+    headers = {}
+    if msgpack is not None:
+        headers["Accept"] = f"{MSGPACK_MIMETYPE}, application/json;q=0.9"
+    if replicas.reads_pinned():
+        headers["X-Read-Primary"] = "1"
+    return headers
+
+
+def decode(response):
+    """Decode a JSON or MessagePack response body"""
+    content_type = response.headers.get("Content-Type", "")
+    if msgpack is not None and content_type.startswith(MSGPACK_MIMETYPE):
+        return msgpack.unpackb(response.content, strict_map_key=False)
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def _get(path, params=None, scopes=()):
+    """GET and decode.
+
+    Cached for FLASK_API_CACHE_SECONDS with coalesced refreshes (see
+    coalesce.py), except for readers pinned to fresh data after their own
+    writes; writes to any of `scopes` drop the cached value. While Flask is
+    down the last good response is served instead.
+    """
+    query = _query_key(path, params)
+    try:
+        if replicas.reads_pinned():
+            return _fetch(path, params, query)
+        return coalesce.get_or_fetch(
+            _read_key(query, scopes),
+            lambda: _fetch(path, params, query),
+            settings.FLASK_API_CACHE_SECONDS,
+        )
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code < 500:
+            raise  # 404 and friends are answers, not outages
+        return _stale_or_raise(query, e)
+    except requests.exceptions.RequestException as e:
+        return _stale_or_raise(query, e)
+
+
+def _fetch(path, params, query):
+    data = decode(_request("get", path, params=params, headers=read_headers()))
+    cache.set(f"flask_stale:{query}", data, settings.FLASK_API_STALE_SECONDS)
+    return data
+
+
+def _query_key(path, params):
+    query = urlencode(sorted(params.items())) if params else ""
+    return f"{path}?{query}"
+
+
+def _stale_or_raise(query, error):
+    data = cache.get(f"flask_stale:{query}")
+    if data is None:
+        raise error
+    logger.warning("Flask API unavailable (%s), serving stale %s", error, query)
+    return data
+
+
+# Cached reads are invalidated per scope: "stories" (story lists),
+# "story:<id>" (a story, its start page and its pages, one by one or all
+# together) and "pages" (batches of pages from any story). A read's key
+# holds the current generation of the global scope and of its own scopes;
+# a write replaces the generations of the scopes it touches, so later reads
+# miss and the old entries expire unused.
+
+
+def _read_key(query, scopes=(), generations=None):
+    return f"flask_read:{generations or _read_generations(scopes)}:{query}"
+
+
+def _read_generations(scopes):
+    keys = [READ_GENERATION_KEY] + [f"{READ_GENERATION_KEY}:{s}" for s in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:  # never written, or evicted
+            generations[key] = cache.get_or_set(key, time.time_ns(), None)
+    return ".".join(str(generations[key]) for key in keys)
+
+
+def _invalidate_reads(*scopes):
+    """Drop the cached reads of `scopes`, or every cached read"""
+    keys = [f"{READ_GENERATION_KEY}:{s}" for s in scopes] or [READ_GENERATION_KEY]
+    # A fresh value, not incr(): an evicted generation can never come back
+    cache.set_many(dict.fromkeys(keys, time.time_ns()), None)
+
+
+def _story_scopes(story_id):
+    """What a page or choice write touches: the story's reads and page batches"""
+    if story_id is None:
+        return ()  # unknown story: everything
+    return (f"story:{story_id}", "pages")
+
+
 def get_published_stories():
     """GET /stories?status=published"""
-    response = requests.get(f"{BASE_URL}/stories?status=published")
-    response.raise_for_status()
-    return response.json()
+    return _get("/stories", {"status": "published"}, scopes=("stories",))
 
 
 def get_all_stories():
     """GET /stories"""
-    response = requests.get(f"{BASE_URL}/stories")
-    response.raise_for_status()
-    return response.json()
+    return _get("/stories", scopes=("stories",))
 
 
 def get_stories_by_author(author_id):
     """GET /stories?author_id=<id>"""
-    response = requests.get(f"{BASE_URL}/stories", params={"author_id": author_id})
-    response.raise_for_status()
-    return response.json()
+    return _get("/stories", {"author_id": author_id}, scopes=("stories",))
 
 
 def get_story(story_id):
     """GET /stories/<id>"""
-    response = requests.get(f"{BASE_URL}/stories/{story_id}")
-    response.raise_for_status()
-    return response.json()
+    return _get(f"/stories/{story_id}", scopes=(f"story:{story_id}",))
 
 
 def get_story_pages(story_id):
     """GET /stories/<id>/pages — all pages with choices"""
-    response = requests.get(f"{BASE_URL}/stories/{story_id}/pages")
-    response.raise_for_status()
-    return response.json()
+    return _get(f"/stories/{story_id}/pages", scopes=(f"story:{story_id}",))
 
 
 def get_start_page(story_id):
     """GET /stories/<id>/start"""
-    response = requests.get(f"{BASE_URL}/stories/{story_id}/start")
-    response.raise_for_status()
-    return response.json()
+    return _get(f"/stories/{story_id}/start", scopes=(f"story:{story_id}",))
 
 
-def get_page(page_id):
-    """GET /pages/<id>"""
-    response = requests.get(f"{BASE_URL}/pages/{page_id}")
-    response.raise_for_status()
-    return response.json()
+def get_page(page_id, story_id):
+    """GET /pages/<id> of story `story_id` (cached with the story's reads)"""
+    return _get(f"/pages/{page_id}", scopes=(f"story:{story_id}",))
+
+
+def get_snapshot(content_hash):
+    """GET /snapshots/<hash> — immutable, so cached for a long time"""
+    return coalesce.get_or_fetch(
+        f"flask_snapshot:{content_hash}",
+        lambda: decode(_request("get", f"/snapshots/{content_hash}")),
+        settings.FLASK_SNAPSHOT_CACHE_SECONDS,
+    )
+
+
+def get_pages(page_ids):
+    """GET /pages?ids=... — several pages with choices, in `page_ids` order.
+
+    Split into batches of at most PAGES_BATCH_MAX ids; unknown ids are
+    left out of the result.
+    """
+    page_ids = list(dict.fromkeys(page_ids))
+    pages = []
+    for start in range(0, len(page_ids), PAGES_BATCH_MAX):
+        batch = page_ids[start : start + PAGES_BATCH_MAX]
+        pages.extend(
+            _get("/pages", {"ids": ",".join(map(str, batch))}, scopes=("pages",))
+        )
+    return pages
+
+
+def warm_pages(page_ids, story_id):
+    """Load pages of story `story_id` that get_page() has not cached yet, in
+    one batch call.
+
+    Returns the pages fetched (already cached ones are skipped). At most
+    PAGES_BATCH_MAX pages per call.
+    """
+    generations = _read_generations((f"story:{story_id}",))
+    keys = {
+        page_id: _read_key(
+            _query_key(f"/pages/{page_id}", None), generations=generations
+        )
+        for page_id in dict.fromkeys(page_ids)
+    }
+    cached = cache.get_many(keys.values())
+    missing = [page_id for page_id, key in keys.items() if key not in cached]
+    if not missing:
+        return []
+
+    started = time.monotonic()
+    pages = decode(
+        _request(
+            "get",
+            "/pages",
+            params={"ids": ",".join(map(str, missing[:PAGES_BATCH_MAX]))},
+            headers=read_headers(),
+        )
+    )
+    coalesce.put_many(
+        {keys[page["id"]]: page for page in pages if page["story_id"] == story_id},
+        settings.FLASK_API_CACHE_SECONDS,
+        delta=time.monotonic() - started,
+    )
+    return pages
 
 
 # WRITE OPERATIONS (require API key)
@@ -74,8 +317,9 @@ def create_story(title, description, status="draft", author_id=None):
         "status": status,
         "author_id": author_id,
     }
-    response = requests.post(f"{BASE_URL}/stories", json=data, headers=get_headers())
-    response.raise_for_status()
+    response = _request(
+        "post", "/stories", invalidates=("stories",), json=data, headers=get_headers()
+    )
     return response.json()
 
 
@@ -100,22 +344,49 @@ def update_story(
     if requesting_author_id is not None:
         data["requesting_author_id"] = requesting_author_id
 
-    response = requests.put(
-        f"{BASE_URL}/stories/{story_id}", json=data, headers=get_headers()
+    response = _request(
+        "put",
+        f"/stories/{story_id}",
+        invalidates=("stories", f"story:{story_id}"),
+        json=data,
+        headers=get_headers(),
     )
-    response.raise_for_status()
     return response.json()
 
 
+def update_statuses(story_ids, status):
+    """PUT /stories/status — set the status of many stories (moderation).
+
+    Split into batches of at most STORIES_BATCH_MAX ids; returns the ids
+    Flask updated.
+    """
+    story_ids = list(dict.fromkeys(story_ids))
+    updated = []
+    for start in range(0, len(story_ids), STORIES_BATCH_MAX):
+        batch = story_ids[start : start + STORIES_BATCH_MAX]
+        response = _request(
+            "put",
+            "/stories/status",
+            invalidates=("stories", *(f"story:{story_id}" for story_id in batch)),
+            json={"ids": batch, "status": status},
+            headers=get_headers(),
+        )
+        updated.extend(response.json()["updated"])
+    return updated
+
+
 def delete_story(story_id, requesting_author_id=None):
     """DELETE /stories/<id>"""
     data = {}
     if requesting_author_id is not None:
         data["requesting_author_id"] = requesting_author_id
-    response = requests.delete(
-        f"{BASE_URL}/stories/{story_id}", json=data or None, headers=get_headers()
+    response = _request(
+        "delete",
+        f"/stories/{story_id}",
+        invalidates=("stories", f"story:{story_id}", "pages"),
+        json=data or None,
+        headers=get_headers(),
     )
-    response.raise_for_status()
     return response.json()
 
 
@@ -129,15 +400,21 @@ def create_page(
         "ending_label": ending_label,
         "is_start_page": is_start_page,
     }
-    response = requests.post(
-        f"{BASE_URL}/stories/{story_id}/pages", json=data, headers=get_headers()
+    invalidates = _story_scopes(story_id)
+    if is_start_page:
+        invalidates += ("stories",)  # story lists show start_page_id
+    response = _request(
+        "post",
+        f"/stories/{story_id}/pages",
+        invalidates=invalidates,
+        json=data,
+        headers=get_headers(),
     )
-    response.raise_for_status()
     return response.json()
 
 
-def update_page(page_id, text=None, is_ending=None, ending_label=None):
-    """PUT /pages/<id>"""
+def update_page(page_id, text=None, is_ending=None, ending_label=None, story_id=None):
+    """PUT /pages/<id> (`story_id`: the page's story, to invalidate only its reads)"""
     data = {}
     if text is not None:
         data["text"] = text
@@ -146,54 +423,65 @@ def update_page(page_id, text=None, is_ending=None, ending_label=None):
     if ending_label is not None:
         data["ending_label"] = ending_label
 
-    response = requests.put(
-        f"{BASE_URL}/pages/{page_id}", json=data, headers=get_headers()
+    response = _request(
+        "put",
+        f"/pages/{page_id}",
+        invalidates=_story_scopes(story_id),
+        json=data,
+        headers=get_headers(),
     )
-    response.raise_for_status()
     return response.json()
 
 
-def delete_page(page_id):
-    """DELETE /pages/<id>"""
-    response = requests.delete(f"{BASE_URL}/pages/{page_id}", headers=get_headers())
-    response.raise_for_status()
+def delete_page(page_id, story_id=None):
+    """DELETE /pages/<id> (`story_id`: the page's story)"""
+    invalidates = ("stories", *_story_scopes(story_id)) if story_id else ()
+    response = _request(
+        "delete", f"/pages/{page_id}", invalidates=invalidates, headers=get_headers()
+    )
     return response.json()
 
 
-def create_choice(page_id, text, next_page_id):
-    """POST /pages/<id>/choices"""
+def create_choice(page_id, text, next_page_id, story_id=None):
+    """POST /pages/<id>/choices (`story_id`: the page's story)"""
     data = {
         "text": text,
         "next_page_id": next_page_id,
     }
-    response = requests.post(
-        f"{BASE_URL}/pages/{page_id}/choices", json=data, headers=get_headers()
+    response = _request(
+        "post",
+        f"/pages/{page_id}/choices",
+        invalidates=_story_scopes(story_id),
+        json=data,
+        headers=get_headers(),
     )
-    response.raise_for_status()
     return response.json()
 
 
-def update_choice(page_id, choice_id, text=None, next_page_id=None):
-    """PUT /pages/<page_id>/choices/<choice_id>"""
+def update_choice(page_id, choice_id, text=None, next_page_id=None, story_id=None):
+    """PUT /pages/<page_id>/choices/<choice_id> (`story_id`: the page's story)"""
     data = {}
     if text is not None:
         data["text"] = text
     if next_page_id is not None:
         data["next_page_id"] = next_page_id
 
-    response = requests.put(
-        f"{BASE_URL}/pages/{page_id}/choices/{choice_id}",
+    response = _request(
+        "put",
+        f"/pages/{page_id}/choices/{choice_id}",
+        invalidates=_story_scopes(story_id),
         json=data,
         headers=get_headers(),
     )
-    response.raise_for_status()
     return response.json()
 
 
-def delete_choice(page_id, choice_id):
-    """DELETE /pages/<page_id>/choices/<choice_id>"""
-    response = requests.delete(
-        f"{BASE_URL}/pages/{page_id}/choices/{choice_id}", headers=get_headers()
+def delete_choice(page_id, choice_id, story_id=None):
+    """DELETE /pages/<page_id>/choices/<choice_id> (`story_id`: the page's story)"""
+    response = _request(
+        "delete",
+        f"/pages/{page_id}/choices/{choice_id}",
+        invalidates=_story_scopes(story_id),
+        headers=get_headers(),
     )
-    response.raise_for_status()
     return response.json()
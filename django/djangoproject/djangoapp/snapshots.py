@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+from django.http import Http404
+
+from .services import flask_api
+
+# Published story snapshots (Flask: snapshots.py)
+# Readers are served from the immutable snapshot a story was published
+# with, so one cached object answers every page of a story and author
+# edits to the live rows don't reach readers until the next publish.
+# Stories that are not published (drafts being previewed) fall back to
+# live pages; Flask clears the snapshot when a story leaves published.
+#
+# A snapshot never changes, so besides the shared cache each process keeps
+# the most recently used ones decoded in memory. Treat them as read-only.
+
+
+@lru_cache(maxsize=64)
+def get_snapshot(content_hash):
+    return flask_api.get_snapshot(content_hash)
+
+
+def for_story(story_id):
+    """The story's published snapshot, or None if it is not published"""
+    story = flask_api.get_story(story_id)
+    content_hash = story.get("snapshot_hash")
+    if story.get("status") != "published" or not content_hash:
+        return None
+    return get_snapshot(content_hash)
+
+
+def get_page(snapshot, page_id):
+    """Page dict (with choices) from a snapshot; 404 if not published"""
+    page = snapshot["pages"].get(str(page_id))
+    if page is None:
+        raise Http404("Page not found in the published story")
+    return page
@@ -0,0 +1,237 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import (
+    Play,
+    StoryPlayStats,
+    EndingPlayStats,
+    StatsWatermark,
+    HourlyPlayRollup,
+    DailyPlayRollup,
+)
+
+# Materialized statistics
+# The statistics page reads StoryPlayStats / EndingPlayStats only.
+# They are filled from Play by `manage.py refresh_statistics`, either fully
+# or incrementally (only plays above the stored Play.id watermark).
+#
+# Time series live in HourlyPlayRollup / DailyPlayRollup, filled the same
+# way by `manage.py rollup_plays`. Rollups are never deleted, so once plays
+# are rolled up the raw Play rows can be compacted away and the summary
+# tables can still be rebuilt from the daily rollups.
+
+WATERMARK_NAME = "play_stats"
+ROLLUP_WATERMARK_NAME = "play_rollups"
+
+ROLLUPS = {
+    "hour": (HourlyPlayRollup, TruncHour),
+    "day": (DailyPlayRollup, TruncDay),
+}
+
+
+def get_watermark(name=WATERMARK_NAME):
+    """Return the watermark row for `name` (unsaved default if missing)"""
+    return StatsWatermark.objects.filter(name=name).first() or StatsWatermark(
+        name=name
+    )
+
+
+def _lock_watermark(name):
+    watermark, _ = StatsWatermark.objects.select_for_update().get_or_create(
+        name=name
+    )
+    return watermark
+
+
+def _high_play_id():
+    return Play.objects.aggregate(high=Max("id"))["high"] or 0
+
+
+# ── Summary tables ──────────────────────────────────────────────────────────
+
+
+def refresh_play_stats(full=False):
+    """Fold plays into the summary tables, returns the number of plays processed.
+
+    A full rebuild first brings the daily rollups up to date and recomputes
+    the summary from them, so it stays exact after raw plays are compacted.
+    """
+    if full:
+        rollup_plays()
+
+    with transaction.atomic():
+        watermark = _lock_watermark(WATERMARK_NAME)
+
+        if full:
+            rollup_watermark = get_watermark(ROLLUP_WATERMARK_NAME)
+            source = DailyPlayRollup.objects.all()
+            processed = source.aggregate(n=Sum("plays"))["n"] or 0
+            high = rollup_watermark.last_play_id
+            StoryPlayStats.objects.all().delete()
+            EndingPlayStats.objects.all().delete()
+            count = Sum("plays")
+        else:
+            high = _high_play_id()
+            source = Play.objects.filter(id__gt=watermark.last_play_id, id__lte=high)
+            processed = source.count()
+            count = Count("id")
+
+        if processed:
+            merge_counts(
+                StoryPlayStats,
+                ("story_id",),
+                "total_plays",
+                source.values_list("story_id").annotate(n=count),
+            )
+            merge_counts(
+                EndingPlayStats,
+                ("story_id", "ending_page_id"),
+                "count",
+                source.values_list("story_id", "ending_page_id").annotate(n=count),
+            )
+
+        watermark.last_play_id = high
+        watermark.refreshed_at = timezone.now()
+        watermark.save()
+
+    return processed
+
+
+# ── Time-bucketed rollups ───────────────────────────────────────────────────
+
+
+def rollup_plays():
+    """Fold plays above the rollup watermark into the hourly and daily rollups"""
+    with transaction.atomic():
+        watermark = _lock_watermark(ROLLUP_WATERMARK_NAME)
+        high = _high_play_id()
+        new_plays = Play.objects.filter(id__gt=watermark.last_play_id, id__lte=high)
+        processed = new_plays.count()
+
+        if processed:
+            for model, trunc in ROLLUPS.values():
+                merge_counts(
+                    model,
+                    ("story_id", "bucket_start", "ending_page_id"),
+                    "plays",
+                    new_plays.annotate(bucket=trunc("created_at"))
+                    .values_list("story_id", "bucket", "ending_page_id")
+                    .annotate(n=Count("id")),
+                )
+
+        watermark.last_play_id = high
+        watermark.refreshed_at = timezone.now()
+        watermark.save()
+
+    return processed
+
+
+def play_counts(story_ids):
+    """{story_id: plays} from StoryPlayStats plus the plays not folded in yet.
+
+    Exact even after compact_plays, which only deletes folded-in plays.
+    """
+    counts = dict.fromkeys(story_ids, 0)
+    counts.update(
+        StoryPlayStats.objects.filter(story_id__in=story_ids).values_list(
+            "story_id", "total_plays"
+        )
+    )
+    recent = (
+        Play.objects.filter(
+            story_id__in=story_ids, id__gt=get_watermark().last_play_id
+        )
+        .values_list("story_id")
+        .annotate(n=Count("id"))
+    )
+    for story_id, n in recent:
+        counts[story_id] += n
+    return counts
+
+
+def compact_plays(retention_days, batch_size=1000):
+    """Delete raw plays older than `retention_days` once they are rolled up.
+
+    The cutoff is aligned to midnight so compacted plays always cover whole
+    daily buckets. Only plays every consumer has folded in (rollups,
+    summary tables, rankings) are deleted. Returns the number of Play rows
+    deleted.
+    """
+    from . import rankings  # rankings builds on this module
+
+    rollup_plays()
+    refresh_play_stats()
+    rankings.refresh_rankings()
+
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    cutoff = cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+    safe_id = min(
+        get_watermark(ROLLUP_WATERMARK_NAME).last_play_id,
+        get_watermark(WATERMARK_NAME).last_play_id,
+        get_watermark(rankings.WATERMARK_NAME).last_play_id,
+    )
+
+    deleted = 0
+    expired = Play.objects.filter(id__lte=safe_id, created_at__lt=cutoff)
+    while True:
+        ids = list(expired.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += Play.objects.filter(id__in=ids).delete()[0]
+    return deleted
+
+
+def story_timeseries(story_id, granularity="day", since=None):
+    """Return [{"start", "plays", "endings": {ending_page_id: plays}}] buckets"""
+    model, _ = ROLLUPS[granularity]
+    rows = model.objects.filter(story_id=story_id)
+    if since is not None:
+        rows = rows.filter(bucket_start__gte=since)
+
+    buckets = {}
+    for bucket_start, ending_page_id, plays in rows.order_by(
+        "bucket_start"
+    ).values_list("bucket_start", "ending_page_id", "plays"):
+        bucket = buckets.setdefault(
+            bucket_start, {"start": bucket_start.isoformat(), "plays": 0, "endings": {}}
+        )
+        bucket["plays"] += plays
+        bucket["endings"][ending_page_id] = plays
+    return list(buckets.values())
+
+
+# ── Helpers ─────────────────────────────────────────────────────────────────
+
+
+def merge_counts(model, key_fields, counter_field, rows):
+    """Add (key..., n) deltas into `model`.
+
+    One read of the affected rows, one bulk update, one bulk insert.
+    """
+    deltas = {tuple(row[:-1]): row[-1] for row in rows}
+    if not deltas:
+        return
+
+    lookups = {
+        f"{field}__in": {key[i] for key in deltas}
+        for i, field in enumerate(key_fields)
+    }
+    to_update = []
+    for obj in model.objects.filter(**lookups):
+        key = tuple(getattr(obj, field) for field in key_fields)
+        if key in deltas:
+            setattr(obj, counter_field, getattr(obj, counter_field) + deltas.pop(key))
+            to_update.append(obj)
+
+    model.objects.bulk_update(to_update, [counter_field], batch_size=500)
+    model.objects.bulk_create(
+        [
+            model(**dict(zip(key_fields, key)), **{counter_field: n})
+            for key, n in deltas.items()
+        ],
+        batch_size=500,
+    )
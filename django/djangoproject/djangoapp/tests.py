@@ -1,3 +1,554 @@
-from django.test import TestCase
+import threading
+import warnings
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from . import jobs, moderation, paths, rankings, ratelimit, replicas, stats
+from .models import (
+    Play,
+    Rating,
+    ReadingProgress,
+    ReadingSession,
+    Report,
+    StatsWatermark,
+    StoryJob,
+)
+from .services import circuit_breaker, coalesce, flask_api
+from .services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class DatabaseIntegrityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader")
+
+    @skipUnlessDBFeature("supports_foreign_keys")
+    def test_foreign_keys_enforced(self):
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA foreign_keys")
+                self.assertEqual(cursor.fetchone()[0], 1)
+        # Django's constraints are deferred to the end of the transaction
+        with transaction.atomic():
+            Rating.objects.create(user_id=12345, story_id=1, rating=5)
+            with self.assertRaises(IntegrityError):
+                connection.check_constraints()
+            transaction.set_rollback(True)
+
+    def test_deleting_a_user(self):
+        now = timezone.now()
+        Play.objects.create(user=self.user, story_id=1, ending_page_id=3)
+        ReadingSession.objects.create(
+            user=self.user,
+            story_id=1,
+            path=b"",
+            started_at=now - timedelta(minutes=5),
+            ended_at=now,
+        )
+        Rating.objects.create(user=self.user, story_id=1, rating=4)
+        ReadingProgress.objects.create(user=self.user, story_id=1, page_id=2)
+        StoryJob.objects.create(user=self.user, kind="create_story", payload={})
+
+        self.user.delete()
+
+        # Reading history stays (anonymous), the user's own data goes
+        self.assertEqual(Play.objects.get().user, None)
+        self.assertEqual(ReadingSession.objects.get().user, None)
+        self.assertFalse(Rating.objects.exists())
+        self.assertFalse(ReadingProgress.objects.exists())
+        self.assertFalse(StoryJob.objects.exists())
+
+
+class StatisticsTimeseriesTests(TestCase):
+    def get(self, days):
+        url = reverse("statistics_timeseries", args=[1])
+        return self.client.get(url, {"days": days})
+
+    def test_days_in_range(self):
+        response = self.get(7)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["buckets"], [])
+
+    def test_days_out_of_range(self):
+        for days in (0, -1, 1000000, "10" * 30):
+            with self.subTest(days=days):
+                self.assertEqual(self.get(days).status_code, 400)
+
+    def test_days_not_an_integer(self):
+        self.assertEqual(self.get("week").status_code, 400)
+
+
+class ReadingPathTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get("/")
+        self.request.session = SessionStore()
+        self.request.user = AnonymousUser()
+
+    def view(self, *page_ids, ending=None):
+        for page_id in page_ids:
+            paths.record_page_view(self.request, 1, page_id, page_id == ending)
+
+    def test_encode_decode_round_trip(self):
+        for page_ids in ([], [1], [12, 13, 15, 13], [7, 7], [2**40, 1, 300, 299]):
+            with self.subTest(page_ids=page_ids):
+                encoded = paths.encode_path(page_ids)
+                self.assertEqual(paths.decode_path(encoded), page_ids)
+        self.assertEqual(len(paths.encode_path([12, 13, 15, 13])), 4)
+
+    def test_reloads_are_not_steps(self):
+        self.view(10, 10, 11, 12, 12, ending=12)
+        self.view(12, ending=12)  # reloading the ending
+
+        session = ReadingSession.objects.get()
+        self.assertEqual(session.page_count, 3)
+        self.assertEqual(paths.decode_path(session.path), [10, 11, 12])
+        self.assertEqual(session.ending_page_id, 12)
+
+    def test_restart_begins_a_new_path(self):
+        self.view(10, ending=10)
+        paths.restart_story(self.request, 1)
+        self.view(10, ending=10)
+
+        self.assertEqual(ReadingSession.objects.count(), 2)
+
+
+class StoryJobSweepTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("author")
+        self.long_ago = timezone.now() - timedelta(seconds=settings.STORY_JOB_TIMEOUT)
+
+        def job(status, at):
+            job = StoryJob.objects.create(
+                user=user, kind="create_story", payload={}, status=status
+            )
+            StoryJob.objects.filter(id=job.id).update(created_at=at, started_at=at)
+            return job.id
+
+        self.stale = job("running", self.long_ago)
+        self.running = job("running", timezone.now())
+        self.orphan = job("queued", self.long_ago)
+        self.queued = job("queued", timezone.now())
+
+    def status(self, job_id):
+        return StoryJob.objects.get(id=job_id).status
+
+    def test_in_process_sweep(self):
+        with mock.patch.object(jobs, "_get_executor") as executor:
+            self.assertEqual(jobs.sweep(), 1)
+        self.assertEqual(self.status(self.stale), "failed")
+        self.assertEqual(self.status(self.running), "running")
+        executor().submit.assert_called_once_with(jobs._run_in_thread, self.orphan)
+
+    @override_settings(STORY_JOBS_IN_PROCESS=False)
+    def test_run_jobs_mode_leaves_the_queue_to_run_jobs(self):
+        with mock.patch.object(jobs, "_get_executor") as executor:
+            self.assertEqual(jobs.sweep(), 0)
+        self.assertEqual(self.status(self.stale), "failed")
+        executor.assert_not_called()
+
+    def test_sweep_if_due_runs_once_per_interval(self):
+        with mock.patch.object(jobs, "_last_sweep", None), mock.patch.object(
+            jobs, "sweep"
+        ) as sweep:
+            jobs.sweep_if_due()
+            jobs.sweep_if_due()
+        sweep.assert_called_once_with()
+
+
+class PlayCountTests(TestCase):
+    def play(self, story_id, n=1):
+        Play.objects.bulk_create(
+            [Play(story_id=story_id, ending_page_id=9) for _ in range(n)]
+        )
+
+    def test_counts_survive_compaction(self):
+        self.play(1, 3)
+        self.play(2)
+        stats.refresh_play_stats()
+        Play.objects.all().delete()  # folded in, then compacted away
+        self.play(1, 2)  # not folded in yet
+
+        self.assertEqual(stats.play_counts([1, 2, 3]), {1: 5, 2: 1, 3: 0})
+
+
+class StatisticsFunnelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_funnel_is_cached(self):
+        ReadingSession.objects.create(
+            story_id=1,
+            path=paths.encode_path([10, 11]),
+            page_count=2,
+            started_at=timezone.now(),
+            ended_at=timezone.now(),
+        )
+        url = reverse("statistics_funnel", args=[1])
+        first = self.client.get(url).json()
+
+        ReadingSession.objects.all().delete()
+        with self.assertNumQueries(0):
+            second = self.client.get(url).json()
+
+        self.assertEqual(second, first)
+        self.assertEqual(first["sessions"], 1)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills_over_time(self):
+        store = ratelimit.CacheStore()
+        with mock.patch("djangoapp.ratelimit.time.time", return_value=100.0):
+            self.assertEqual(store.take("a", 2, 0.5), 0)
+            self.assertEqual(store.take("a", 2, 0.5), 0)
+            self.assertAlmostEqual(store.take("a", 2, 0.5), 2)
+            self.assertEqual(store.take("b", 2, 0.5), 0)
+        with mock.patch("djangoapp.ratelimit.time.time", return_value=101.0):
+            self.assertAlmostEqual(store.take("a", 2, 0.5), 1)
+        with mock.patch("djangoapp.ratelimit.time.time", return_value=103.0):
+            self.assertEqual(store.take("a", 2, 0.5), 0)
+
+    def test_bucket_never_holds_more_than_its_capacity(self):
+        self.assertEqual(ratelimit._take(0, 1000, 1, 1), (0, 0))
+        tokens, wait = ratelimit._take(0, -5, 1, 1)  # clock went backwards
+        self.assertEqual((tokens, wait), (0, 1))
+
+    def client_key(self, **meta):
+        request = RequestFactory().post("/", **meta)
+        request.user = AnonymousUser()
+        return ratelimit.client_key(request)
+
+    def test_anonymous_clients_by_connection_address(self):
+        key = self.client_key(REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.2.3.4")
+        self.assertEqual(key, "ip:10.0.0.1")
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=1)
+    def test_anonymous_clients_behind_a_proxy(self):
+        forwarded = self.client_key(
+            REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 1.2.3.4"
+        )
+        self.assertEqual(forwarded, "ip:1.2.3.4")
+        self.assertEqual(self.client_key(REMOTE_ADDR="10.0.0.1"), "ip:10.0.0.1")
+
+    def test_story_jobs_write_for_their_author(self):
+        self.assertNotIn("X-Client-Id", flask_api.get_headers())
+        with flask_api.acting_for("user:7"):
+            self.assertEqual(flask_api.get_headers()["X-Client-Id"], "user:7")
+
+
+# Routing decisions only: the "replica" alias is never queried, so
+# overriding DATABASES (which Django warns about) is safe here
+warnings.filterwarnings("ignore", "Overriding setting DATABASES", UserWarning)
+
+
+@override_settings(
+    DATABASES={**settings.DATABASES, "replica": settings.DATABASES["default"]}
+)
+class ReplicaRoutingTests(TestCase):
+    def request(self, method="get", cookies=None, write=None):
+        """Run a view (that calls `write`) through ReadYourWritesMiddleware"""
+        seen = {}
+
+        def view(request):
+            seen["read_db"] = Play.objects.all().db
+            seen["headers"] = flask_api.read_headers()
+            if write:
+                write()
+                seen["read_db_after_write"] = Play.objects.all().db
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)("/")
+        request.COOKIES.update(cookies or {})
+        response = replicas.ReadYourWritesMiddleware(view)(request)
+        return seen, response
+
+    def test_get_reads_from_the_replica(self):
+        seen, response = self.request()
+        self.assertEqual(seen["read_db"], "replica")
+        self.assertNotIn("X-Read-Primary", seen["headers"])
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_post_reads_from_the_primary(self):
+        seen, _ = self.request("post")
+        self.assertEqual(seen["read_db"], "default")
+        self.assertEqual(seen["headers"]["X-Read-Primary"], "1")
+
+    def test_write_pins_the_request_and_the_next_ones(self):
+        seen, response = self.request(write=lambda: User.objects.create(username="a"))
+        self.assertEqual(seen["read_db_after_write"], "default")
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertTrue(User.objects.using("default").exists())
+
+        seen, _ = self.request(cookies={replicas.PIN_COOKIE: "1"})
+        self.assertEqual(seen["read_db"], "default")
+        self.assertEqual(seen["headers"]["X-Read-Primary"], "1")
+
+    def test_bookkeeping_writes_do_not_pin(self):
+        seen, response = self.request(
+            write=lambda: Play.objects.create(story_id=1, ending_page_id=2)
+        )
+        self.assertEqual(seen["read_db_after_write"], "replica")
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_outside_requests_read_from_the_primary(self):
+        self.assertEqual(Play.objects.all().db, "default")
+
+    def test_no_replica_configured(self):
+        with override_settings(DATABASES={"default": settings.DATABASES["default"]}):
+            seen, response = self.request(
+                write=lambda: User.objects.create(username="a")
+            )
+        self.assertEqual(seen["read_db"], "default")
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch(
+            "djangoapp.services.circuit_breaker.time.monotonic", lambda: self.now
+        )
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.breaker = CircuitBreaker(
+            failure_rate=0.5, min_calls=4, window=30, reset_timeout=15
+        )
+
+    def calls(self, *outcomes):
+        for ok in outcomes:
+            self.breaker.before_call()
+            self.breaker.record(ok)
+
+    def open(self):
+        self.calls(True, True, False, False)
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+
+    def test_opens_at_the_failure_rate(self):
+        self.calls(False, False, False)  # too few calls for a verdict
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.calls(True)
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_failures_outside_the_window_are_forgotten(self):
+        self.calls(False, False, False)
+        self.now += 31
+        self.calls(True, True, False)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.open()
+        self.now += 14
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.now += 1
+        self.breaker.before_call()  # the probe
+        self.assertEqual(self.breaker.state, circuit_breaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()  # concurrent call while probing
+
+    def test_successful_probe_closes(self):
+        self.open()
+        self.now += 15
+        self.calls(True)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.calls(False, False, False)  # history restarted after the probe
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+
+    def test_failed_probe_opens_again(self):
+        self.open()
+        self.now += 15
+        self.calls(False)
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+        self.now += 14
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.now += 1
+        self.breaker.before_call()
+
+
+class CoalesceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.fetches = 0
+
+    def fetch(self, value="fresh"):
+        self.fetches += 1
+        return value
+
+    def test_cached_value_is_served_without_fetching(self):
+        coalesce.put_many({"k": "cached"}, ttl=60, delta=0.01)
+        self.assertEqual(coalesce.get_or_fetch("k", self.fetch, 60), "cached")
+        self.assertEqual(self.fetches, 0)
+
+    def test_miss_fetches_and_stores(self):
+        self.assertEqual(coalesce.get_or_fetch("k", self.fetch, 60), "fresh")
+        self.assertEqual(coalesce.get_or_fetch("k", self.fetch, 60), "fresh")
+        self.assertEqual(self.fetches, 1)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_fetch():
+            entered.set()
+            release.wait(5)
+            return self.fetch(["fresh"])
+
+        results = []
+
+        def read(fetch):
+            results.append(coalesce.get_or_fetch("k", fetch, 60))
+
+        leader = threading.Thread(target=read, args=(slow_fetch,))
+        leader.start()
+        entered.wait(5)
+        followers = [
+            threading.Thread(target=read, args=(self.fetch,)) for _ in range(4)
+        ]
+        for thread in followers:
+            thread.start()
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(results, [["fresh"]] * 5)
+
+    def test_entries_are_refreshed_early_near_expiry(self):
+        with mock.patch("djangoapp.services.coalesce.random.random", lambda: 0.5):
+            # Expires in 60s, fetched in 10ms: far from a refresh
+            coalesce.put_many({"k": "old"}, ttl=60, delta=0.01)
+            self.assertEqual(coalesce.get_or_fetch("k", self.fetch, 60), "old")
+
+            # Expires in 1s, fetched in 10s: refreshed ahead of expiry
+            coalesce.put_many({"k": "old"}, ttl=1, delta=10)
+            self.assertEqual(coalesce.get_or_fetch("k", self.fetch, 60), "fresh")
+        self.assertEqual(self.fetches, 1)
+
+    def test_other_worker_refreshing_serves_the_current_value(self):
+        coalesce.put_many({"k": "old"}, ttl=1, delta=10)
+        cache.add("k:lock", 1)  # another worker is fetching
+        self.assertEqual(coalesce.get_or_fetch("k", self.fetch, 60), "old")
+        self.assertEqual(self.fetches, 0)
+
+    @override_settings(FLASK_API_LOCK_WAIT=0.1)
+    def test_stuck_lock_is_waited_for_then_ignored(self):
+        cache.add("k:lock", 1)
+        self.assertEqual(coalesce.get_or_fetch("k", self.fetch, 60), "fresh")
+        self.assertEqual(self.fetches, 1)
+
+
+class ModerationQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader")
+        self.now = timezone.now().replace(microsecond=0)
+
+    def report(self, story_id, minutes_ago, resolved=False, reason="spam"):
+        report = Report.objects.create(
+            user=self.user,
+            story_id=story_id,
+            reason=reason,
+            description="",
+            resolved=resolved,
+        )
+        Report.objects.filter(id=report.id).update(
+            created_at=self.now - timedelta(minutes=minutes_ago)
+        )
+
+    def all_pages(self, limit):
+        story_ids, cursor, pages = [], None, 0
+        while True:
+            groups, cursor = moderation.story_groups(cursor, limit=limit)
+            story_ids += [group["story_id"] for group in groups]
+            pages += 1
+            if cursor is None:
+                return story_ids, pages
+
+    def test_cursor_round_trip(self):
+        group = {"latest": self.now, "story_id": 42}
+        cursor = moderation.encode_cursor(group)
+        self.assertEqual(moderation.decode_cursor(cursor), (self.now, 42))
+
+    def test_malformed_cursor_starts_over(self):
+        for cursor in (None, "", "garbage", "2026-01-01_x", "yesterday_1"):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(moderation.decode_cursor(cursor))
+
+    def test_pages_cover_every_story_once_newest_first(self):
+        # Stories 3, 4 and 5 tie on their latest report
+        for story_id, minutes_ago in [(1, 50), (2, 40), (3, 5), (4, 5), (5, 5)]:
+            self.report(story_id, minutes_ago)
+        self.report(1, 1, resolved=True)  # resolved reports don't count
+        self.report(2, 60, reason="other")
+
+        story_ids, pages = self.all_pages(limit=2)
+
+        self.assertEqual(story_ids, [5, 4, 3, 2, 1])
+        self.assertEqual(pages, 3)
+
+    def test_full_last_page_has_no_next_cursor(self):
+        for story_id in (1, 2):
+            self.report(story_id, story_id)
+
+        groups, cursor = moderation.story_groups(limit=2)
+
+        self.assertEqual([group["story_id"] for group in groups], [1, 2])
+        self.assertIsNone(cursor)
+
+    def test_groups_count_reasons(self):
+        self.report(1, 3)
+        self.report(1, 2, reason="other")
+        self.report(1, 1, reason="other")
+
+        (group,), _ = moderation.story_groups()
+
+        self.assertEqual(group["reports"], 3)
+        self.assertEqual(group["reasons"], [("Spam", 1), ("Other", 2)])
+
+
+class CompactPlaysTests(TestCase):
+    def setUp(self):
+        Play.objects.bulk_create([Play(story_id=1, ending_page_id=9) for _ in range(5)])
+        self.ids = list(Play.objects.order_by("id").values_list("id", flat=True))
+        # All but the newest play are past the retention period
+        Play.objects.filter(id__in=self.ids[:-1]).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+
+    def test_deletes_old_plays_every_consumer_folded_in(self):
+        deleted = stats.compact_plays(retention_days=5)
+
+        self.assertEqual(deleted, 4)
+        self.assertEqual(list(Play.objects.values_list("id", flat=True)), self.ids[-1:])
+        self.assertEqual(stats.play_counts([1]), {1: 5})
+
+    def test_keeps_plays_the_rankings_have_not_folded_in(self):
+        # Rankings stuck two plays in (e.g. their refresh keeps failing)
+        StatsWatermark.objects.create(
+            name=rankings.WATERMARK_NAME, last_play_id=self.ids[1]
+        )
+        with mock.patch.object(rankings, "refresh_rankings"):
+            deleted = stats.compact_plays(retention_days=5)
+
+        self.assertEqual(deleted, 2)
+        self.assertEqual(list(Play.objects.values_list("id", flat=True)), self.ids[2:])
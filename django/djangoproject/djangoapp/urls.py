@@ -9,11 +9,26 @@ urlpatterns = [
     path("page/<int:page_id>/<int:story_id>/", views.show_page, name="show_page"),
     # Story statistics
     path("statistics/", views.statistics, name="statistics"),
+    path(
+        "statistics/<int:story_id>/timeseries/",
+        views.statistics_timeseries,
+        name="statistics_timeseries",
+    ),
+    path(
+        "statistics/<int:story_id>/funnel/",
+        views.statistics_funnel,
+        name="statistics_funnel",
+    ),
     # Author views (require login)
     path("my-stories/", views.my_stories, name="my_stories"),
     path("story/create/", views.create_story, name="create_story"),
     path("story/<int:story_id>/edit/", views.edit_story, name="edit_story"),
     path("story/<int:story_id>/delete/", views.delete_story, name="delete_story"),
+    # Background story writes (create/edit) and their status
+    path("jobs/<int:job_id>/", views.job_status, name="job_status"),
+    path(
+        "jobs/<int:job_id>/status/", views.job_status_json, name="job_status_json"
+    ),
     # Author publish/unpublish their own stories
     path(
         "story/<int:story_id>/publish/",
@@ -30,6 +45,7 @@ urlpatterns = [
     path("story/<int:story_id>/report/", views.report_story, name="report_story"),
     # CHANGED: moderation instead of admin to avoid conflict with Django admin
     path("moderation/reports/", views.admin_reports, name="admin_reports"),
+    path("moderation/bulk/", views.bulk_moderate, name="bulk_moderate"),
     path(
         "moderation/report/<int:report_id>/resolve/",
         views.resolve_report,
@@ -1,12 +1,28 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import HttpResponse, JsonResponse
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
-from django.db.models import Count, Avg
+from django.db.models import Avg
 from django.contrib import messages
-from .models import Play, Rating, Report
-from .services import flask_api
+from django.utils import timezone
+from datetime import timedelta
+from .models import Play, Rating, Report, StoryPlayStats, EndingPlayStats, StoryJob
+from .services import coalesce, flask_api
+from . import (
+    dashboard,
+    http_cache,
+    jobs,
+    moderation,
+    paths,
+    prefetch,
+    progress,
+    rankings,
+    ratelimit,
+    snapshots,
+    stats,
+)
 import requests
 
 
@@ -20,7 +36,18 @@ def story_list(request):
     try:
         stories = flask_api.get_published_stories()
 
+        # Trending first (see rankings.py), unranked stories in API order
+        scores = rankings.trending_scores([story["id"] for story in stories])
+        stories.sort(key=lambda story: -scores.get(story["id"], 0))
+
+        # Conditional GET: story content + latest rating/play activity
+        etag = http_cache.make_etag(stories, http_cache.activity_fingerprint())
+        not_modified = http_cache.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
         # Enhance with Django data (ratings, play counts)
+        play_counts = stats.play_counts([story["id"] for story in stories])
         for story in stories:
             story_id = story["id"]
             # Get average rating
@@ -33,36 +60,83 @@ def story_list(request):
                 story["rating_count"] = 0
 
             # Get play count
-            story["play_count"] = Play.objects.filter(story_id=story_id).count()
+            story["play_count"] = play_counts[story_id]
 
     except requests.exceptions.RequestException as e:
         return HttpResponse(f"Could not fetch stories from Flask API: {e}", status=500)
 
-    return render(request, "djangoapp/story_list.html", {"stories": stories})
+    response = render(request, "djangoapp/story_list.html", {"stories": stories})
+    return http_cache.patch_reader_headers(request, response, etag)
 
 
 def start_story(request, story_id):
     """Start playing a story - get start page and redirect"""
     try:
-        start_info = flask_api.get_start_page(story_id)
+        snapshot = snapshots.for_story(story_id)
+
+        # Returning readers resume from their saved page, unless the story
+        # no longer has it (deleted, or left out of the latest publish)
+        if request.user.is_authenticated and not request.GET.get("restart"):
+            saved_page_id = progress.get_position(request.user.id, story_id)
+            if saved_page_id:
+                if _has_page(snapshot, story_id, saved_page_id):
+                    messages.info(request, "Resuming where you left off.")
+                    return redirect(
+                        "show_page", page_id=saved_page_id, story_id=story_id
+                    )
+                progress.clear_position(request.user.id, story_id)
+
+        if snapshot is not None:
+            start_page_id = snapshot["start_page_id"]
+        else:
+            start_page_id = flask_api.get_start_page(story_id).get("start_page_id")
     except requests.exceptions.RequestException:
         return HttpResponse("Could not get start page from Flask API", status=500)
 
-    start_page_id = start_info.get("start_page_id")
     if not start_page_id:
         messages.error(request, "This story has no start page set.")
         return redirect("story_list")
 
+    # A fresh start ends any path the reader had in progress for this story
+    paths.restart_story(request, story_id)
+
     return redirect("show_page", page_id=start_page_id, story_id=story_id)
 
 
 def show_page(request, page_id, story_id):
     """Display a page with choices"""
     try:
-        page = flask_api.get_page(page_id)
+        snapshot = snapshots.for_story(story_id)
+        if snapshot is None:
+            page = flask_api.get_page(page_id, story_id)
     except requests.exceptions.RequestException:
         return HttpResponse("Could not fetch page from Flask API", status=500)
 
+    if snapshot is not None:
+        # Published story: the whole page graph is already in hand
+        page = snapshots.get_page(snapshot, page_id)
+    else:
+        # Unpublished story: warm the cache for the pages this one links to
+        prefetch.after_page_view(page)
+
+    # Reader path tracking (cache buffer, persisted once per finished path)
+    paths.record_page_view(request, story_id, page_id, page.get("is_ending"))
+
+    # Saved position for "resume reading" (buffered, written in batches)
+    if request.user.is_authenticated:
+        if page.get("is_ending"):
+            progress.clear_position(request.user.id, story_id)
+        else:
+            progress.save_position(request.user.id, story_id, page_id)
+
+    # Endings record a Play, so they must never be answered from a cache
+    etag = None
+    if not page.get("is_ending"):
+        etag = http_cache.make_etag(page, story_id)
+        not_modified = http_cache.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
     # If ending → save play
     if page.get("is_ending"):
         Play.objects.create(
@@ -70,15 +144,57 @@ def show_page(request, page_id, story_id):
             ending_page_id=page_id,
             user=request.user if request.user.is_authenticated else None,
         )
+        dashboard.invalidate(story_id)
 
     # Choices come from Flask
     choices = page.get("choices", [])
 
-    return render(
+    # Endings suggest what readers of this story also finished
+    recommended = []
+    if page.get("is_ending"):
+        recommended = _recommended_stories(story_id)
+
+    response = render(
         request,
         "djangoapp/page.html",
-        {"page": page, "choices": choices, "story_id": story_id},
+        {
+            "page": page,
+            "choices": choices,
+            "story_id": story_id,
+            "recommended": recommended,
+        },
     )
+    if page.get("is_ending"):
+        return http_cache.never_cache_response(response)
+    return http_cache.patch_reader_headers(request, response, etag)
+
+
+def _has_page(snapshot, story_id, page_id):
+    """Whether readers of the story can still open `page_id`"""
+    if snapshot is not None:
+        return str(page_id) in snapshot["pages"]
+    try:
+        return flask_api.get_page(page_id, story_id)["story_id"] == story_id
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 404:
+            return False
+        raise
+
+
+def _recommended_stories(story_id):
+    """Published stories from rankings.recommendations(), with a share in %"""
+    picks = rankings.recommendations(story_id)
+    if not picks:
+        return []
+    try:
+        published = {story["id"]: story for story in flask_api.get_published_stories()}
+    except requests.exceptions.RequestException:
+        return []
+    return [
+        {**published[other], "percent": round(100 * share)}
+        for other, share in picks
+        if other in published
+    ]
 
 
 # ------------------------
@@ -94,69 +210,52 @@ def my_stories(request):
     except requests.exceptions.RequestException:
         return HttpResponse("Could not fetch stories", status=500)
 
-    return render(request, "djangoapp/my_stories.html", {"stories": all_stories})
+    # Engagement for all the author's stories at once (cached per author)
+    story_stats = dashboard.author_stats(
+        request.user.id, [story["id"] for story in all_stories]
+    )
+
+    # Ending labels: one batch call for the endings of every story
+    ending_ids = {page_id for s in story_stats.values() for page_id in s["endings"]}
+    try:
+        endings = {page["id"]: page for page in flask_api.get_pages(ending_ids)}
+    except requests.exceptions.RequestException:
+        endings = {}
+
+    for story in all_stories:
+        story["stats"] = story_stats[story["id"]]
+        story["endings"] = sorted(
+            (
+                {
+                    "label": (endings.get(page_id) or {}).get("ending_label")
+                    or f"Page {page_id}",
+                    "plays": plays,
+                    "percent": 100 * plays / story["stats"]["plays"],
+                }
+                for page_id, plays in story["stats"]["endings"].items()
+            ),
+            key=lambda ending: -ending["plays"],
+        )
+
+    totals = {
+        "plays": sum(s["plays"] for s in story_stats.values()),
+        "ratings": sum(s["rating_count"] for s in story_stats.values()),
+        "open_reports": sum(s["open_reports"] for s in story_stats.values()),
+    }
+    return render(
+        request,
+        "djangoapp/my_stories.html",
+        {"stories": all_stories, "totals": totals},
+    )
 
 
 @login_required
 def create_story(request):
     """Create a new story with story builder interface"""
     if request.method == "POST":
-        title = request.POST.get("title")
-        description = request.POST.get("description")
-
-        # Get pages and choices data
-        pages_data = request.POST.getlist("page_text[]")
-        pages_ending = request.POST.getlist("page_ending[]")
-        pages_ending_label = request.POST.getlist("page_ending_label[]")
-
-        try:
-            # 1. Create story in Flask
-            publish_immediately = request.POST.get("publish_immediately") == "true"
-            status = "published" if publish_immediately else "draft"
-            result = flask_api.create_story(
-                title, description, status=status, author_id=request.user.id
-            )
-            story_id = result["id"]
-
-            # 2. Create pages
-            page_ids = []
-            for i, page_text in enumerate(pages_data):
-                is_ending = str(i) in pages_ending
-                ending_label = (
-                    pages_ending_label[i] if i < len(pages_ending_label) else None
-                )
-                is_start = i == 0  # First page is start page
-
-                page_result = flask_api.create_page(
-                    story_id,
-                    text=page_text,
-                    is_ending=is_ending,
-                    ending_label=ending_label if is_ending else None,
-                    is_start_page=is_start,
-                )
-                page_ids.append(page_result["id"])
-
-            # 3. Create choices
-            for i, page_id in enumerate(page_ids):
-                # Get choices for this page from form data
-                choice_prefix = f"choice_{i}_"
-                choice_texts = request.POST.getlist(f"{choice_prefix}text[]")
-                choice_targets = request.POST.getlist(f"{choice_prefix}target[]")
-
-                for text, target in zip(choice_texts, choice_targets):
-                    if text and target:  # Only create if both are filled
-                        target_idx = int(target)
-                        if target_idx < len(page_ids):
-                            flask_api.create_choice(
-                                page_id, text=text, next_page_id=page_ids[target_idx]
-                            )
-
-            messages.success(request, f"Story '{title}' created successfully!")
-            return redirect("story_list")
-
-        except requests.exceptions.RequestException as e:
-            messages.error(request, f"Error creating story: {e}")
-            return redirect("create_story")
+        # Story, pages and choices are created in the background
+        job = jobs.enqueue(request.user, "create_story", request.POST)
+        return redirect("job_status", job_id=job.id)
 
     return render(request, "djangoapp/create_story.html")
 
@@ -164,135 +263,17 @@ def create_story(request):
 @login_required
 def edit_story(request, story_id):
     """Edit a story and its pages/choices via Flask API"""
+    if request.method == "POST":
+        # All Flask updates run in the background, see jobs.edit_story
+        job = jobs.enqueue(request.user, "edit_story", request.POST, story_id)
+        return redirect("job_status", job_id=job.id)
+
     try:
         story = flask_api.get_story(story_id)
         pages = flask_api.get_story_pages(story_id)
     except requests.exceptions.RequestException as e:
         return HttpResponse(f"Could not fetch story from Flask API: {e}", status=500)
 
-    if request.method == "POST":
-        title = request.POST.get("title")
-        description = request.POST.get("description")
-        status = request.POST.get("status")
-
-        try:
-            # 1. Update story metadata
-            flask_api.update_story(
-                story_id,
-                title=title,
-                description=description,
-                status=status,
-                requesting_author_id=request.user.id,
-            )
-
-            # 2. Update existing pages
-            existing_page_ids = request.POST.getlist("existing_page_id[]")
-            existing_page_texts = request.POST.getlist("existing_page_text[]")
-            existing_is_ending = request.POST.getlist("existing_page_ending[]")
-            existing_ending_labels = request.POST.getlist(
-                "existing_page_ending_label[]"
-            )
-
-            for i, page_id in enumerate(existing_page_ids):
-                is_ending = page_id in existing_is_ending
-                flask_api.update_page(
-                    int(page_id),
-                    text=existing_page_texts[i] if i < len(existing_page_texts) else "",
-                    is_ending=is_ending,
-                    ending_label=(
-                        existing_ending_labels[i]
-                        if i < len(existing_ending_labels)
-                        else None
-                    ),
-                )
-
-            # 3. Delete removed pages
-            pages_to_delete = request.POST.getlist("delete_page[]")
-            for page_id in pages_to_delete:
-                flask_api.delete_page(int(page_id))
-
-            # 4. Handle choices for existing pages
-            for page_id in existing_page_ids:
-                if page_id in pages_to_delete:
-                    continue
-
-                # Delete removed choices
-                choices_to_delete = request.POST.getlist(f"delete_choice_{page_id}[]")
-                for choice_id in choices_to_delete:
-                    flask_api.delete_choice(int(page_id), int(choice_id))
-
-                # Update existing choices
-                choice_ids = request.POST.getlist(f"choice_id_{page_id}[]")
-                choice_texts = request.POST.getlist(f"choice_text_{page_id}[]")
-                choice_targets = request.POST.getlist(f"choice_target_{page_id}[]")
-
-                for j, choice_id in enumerate(choice_ids):
-                    if choice_id in choices_to_delete:
-                        continue
-                    if (
-                        j < len(choice_texts)
-                        and j < len(choice_targets)
-                        and choice_texts[j]
-                        and choice_targets[j]
-                    ):
-                        flask_api.update_choice(
-                            int(page_id),
-                            int(choice_id),
-                            text=choice_texts[j],
-                            next_page_id=int(choice_targets[j]),
-                        )
-
-                # Add new choices for existing pages
-                new_choice_texts = request.POST.getlist(f"new_choice_text_{page_id}[]")
-                new_choice_targets = request.POST.getlist(
-                    f"new_choice_target_{page_id}[]"
-                )
-                for text, target in zip(new_choice_texts, new_choice_targets):
-                    if text and target:
-                        flask_api.create_choice(
-                            int(page_id), text=text, next_page_id=int(target)
-                        )
-
-            # 5. Add new pages
-            new_page_texts = request.POST.getlist("new_page_text[]")
-            new_page_endings = request.POST.getlist("new_page_ending[]")
-            new_page_labels = request.POST.getlist("new_page_ending_label[]")
-
-            new_page_ids = []
-            for i, text in enumerate(new_page_texts):
-                if not text.strip():
-                    new_page_ids.append(None)
-                    continue
-                is_ending = str(i) in new_page_endings
-                label = new_page_labels[i] if i < len(new_page_labels) else None
-                result = flask_api.create_page(
-                    story_id,
-                    text=text,
-                    is_ending=is_ending,
-                    ending_label=label if is_ending else None,
-                )
-                new_page_ids.append(result["id"])
-
-            # 6. Add choices for new pages
-            for i, new_pid in enumerate(new_page_ids):
-                if new_pid is None:
-                    continue
-                new_choice_texts = request.POST.getlist(f"new_page_choice_text_{i}[]")
-                new_choice_targets = request.POST.getlist(
-                    f"new_page_choice_target_{i}[]"
-                )
-                for text, target in zip(new_choice_texts, new_choice_targets):
-                    if text and target:
-                        flask_api.create_choice(
-                            new_pid, text=text, next_page_id=int(target)
-                        )
-
-            messages.success(request, "Story updated successfully!")
-            return redirect("my_stories")
-
-        except requests.exceptions.RequestException as e:
-            messages.error(request, f"Error updating story: {e}")
-
     # Build a flat list of all page IDs for the "goes to" dropdowns
     all_page_ids = [p["id"] for p in pages]
 
@@ -307,6 +288,29 @@ def edit_story(request, story_id):
     )
 
 
+@login_required
+def job_status(request, job_id):
+    """Progress page for a background story write; polls job_status_json"""
+    job = get_object_or_404(StoryJob, id=job_id, user=request.user)
+    return render(request, "djangoapp/job_status.html", {"job": job})
+
+
+@login_required
+def job_status_json(request, job_id):
+    """Current state of a background story write"""
+    jobs.sweep_if_due()  # a job whose worker died must not stay pending
+    job = get_object_or_404(StoryJob, id=job_id, user=request.user)
+    return JsonResponse(
+        {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "story_id": job.story_id,
+            "error": job.error,
+        }
+    )
+
+
 @login_required
 def delete_story(request, story_id):
     """Delete a story via Flask API"""
@@ -332,18 +336,10 @@ def delete_story(request, story_id):
 
 
 def statistics(request):
-    """Show statistics about plays and endings"""
-    # Group plays by story
-    play_stats = (
-        Play.objects.values("story_id")
-        .annotate(total_plays=Count("id"))
-        .order_by("-total_plays")
-    )
-
-    # Get ending distribution for each story
-    ending_stats = Play.objects.values("story_id", "ending_page_id").annotate(
-        count=Count("id")
-    )
+    """Show statistics about plays and endings (from the materialized tables)"""
+    play_stats = StoryPlayStats.objects.order_by("-total_plays", "story_id")
+    ending_stats = EndingPlayStats.objects.order_by("story_id", "-count")
+    watermark = stats.get_watermark()
 
     return render(
         request,
@@ -351,16 +347,54 @@ def statistics(request):
         {
             "play_stats": play_stats,
             "ending_stats": ending_stats,
+            "refreshed_at": watermark.refreshed_at,
         },
     )
 
 
+def statistics_timeseries(request, story_id):
+    """JSON time series of plays per ending, answered from the rollup tables"""
+    granularity = request.GET.get("granularity", "day")
+    if granularity not in stats.ROLLUPS:
+        return JsonResponse({"error": "granularity must be hour or day"}, status=400)
+
+    max_days = settings.STATS_TIMESERIES_MAX_DAYS
+    try:
+        days = int(request.GET.get("days", 30))
+    except ValueError:
+        days = None
+    if days is None or not 1 <= days <= max_days:
+        return JsonResponse(
+            {"error": f"days must be an integer from 1 to {max_days}"}, status=400
+        )
+    since = timezone.now() - timedelta(days=days)
+
+    return JsonResponse(
+        {
+            "story_id": story_id,
+            "granularity": granularity,
+            "buckets": stats.story_timeseries(story_id, granularity, since),
+        }
+    )
+
+
+def statistics_funnel(request, story_id):
+    """JSON per-page reach and drop-off rates for a story (cached)"""
+    funnel = coalesce.get_or_fetch(
+        f"story_funnel:{story_id}",
+        lambda: paths.story_funnel(story_id),
+        settings.STATS_FUNNEL_CACHE_SECONDS,
+    )
+    return JsonResponse(funnel)
+
+
 # ------------------------
 # LEVEL 18: RATINGS & COMMENTS
 # ------------------------
 
 
 @login_required
+@ratelimit.rate_limit("rate_story")
 def rate_story(request, story_id):
     """Rate and comment on a story"""
     if request.method == "POST":
@@ -373,6 +407,7 @@ def rate_story(request, story_id):
             story_id=story_id,
             defaults={"rating": rating_value, "comment": comment},
         )
+        dashboard.invalidate(story_id)
 
         messages.success(request, "Your rating has been saved!")
         return redirect("story_list")
@@ -396,6 +431,7 @@ def rate_story(request, story_id):
 
 
 @login_required
+@ratelimit.rate_limit("report_story")
 def report_story(request, story_id):
     """Report a story for moderation"""
     if request.method == "POST":
@@ -405,6 +441,7 @@ def report_story(request, story_id):
         Report.objects.create(
             user=request.user, story_id=story_id, reason=reason, description=description
         )
+        dashboard.invalidate(story_id)
 
         messages.success(request, "Report submitted. Thank you!")
         return redirect("story_list")
@@ -425,9 +462,46 @@ def report_story(request, story_id):
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def admin_reports(request):
-    """View all reports (admin only)"""
-    reports = Report.objects.filter(resolved=False).order_by("-created_at")
-    return render(request, "djangoapp/admin_reports.html", {"reports": reports})
+    """Open reports grouped per story, newest first (admin only)"""
+    groups, next_cursor = moderation.story_groups(request.GET.get("after"))
+    latest = moderation.latest_reports([group["story_id"] for group in groups])
+    for group in groups:
+        group["latest_reports"] = latest.get(group["story_id"], [])
+    return render(
+        request,
+        "djangoapp/admin_reports.html",
+        {"groups": groups, "next_cursor": next_cursor},
+    )
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def bulk_moderate(request):
+    """Resolve the reports of, or suspend, the selected stories (admin only)"""
+    if request.method != "POST":
+        return redirect("admin_reports")
+
+    story_ids = [int(i) for i in request.POST.getlist("story_id") if i.isdigit()]
+    action = request.POST.get("action")
+    if not story_ids:
+        messages.error(request, "No stories selected.")
+    elif action == "resolve":
+        resolved = moderation.resolve(story_ids)
+        messages.success(request, f"{resolved} reports marked as resolved.")
+    elif action == "suspend":
+        try:
+            suspended, resolved = moderation.suspend(story_ids)
+            messages.success(
+                request,
+                f"{len(suspended)} stories suspended, "
+                f"{resolved} reports marked as resolved.",
+            )
+        except requests.exceptions.RequestException as e:
+            messages.error(request, f"Error suspending stories: {e}")
+    else:
+        messages.error(request, "Unknown action.")
+
+    return redirect("admin_reports")
 
 
 @login_required
@@ -437,6 +511,7 @@ def resolve_report(request, report_id):
     report = get_object_or_404(Report, id=report_id)
     report.resolved = True
     report.save()
+    dashboard.invalidate(report.story_id)
     messages.success(request, "Report marked as resolved.")
     return redirect("admin_reports")
 
@@ -472,6 +547,7 @@ def publish_story(request, story_id):
 # ------------------------
 
 
+@ratelimit.rate_limit("register")
 def register(request):
     """User registration"""
     if request.method == "POST":
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'djangoapp.replicas.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,6 +82,36 @@ DATABASES = {
     }
 }
 
+# Optional read replica (djangoapp.replicas): read-only requests read from
+# it, writes and the reader's requests right after a write use 'default'
+if os.environ.get('DJANGO_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DJANGO_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['djangoapp.replicas.PrimaryReplicaRouter']
+
+# Cache shared by all worker processes: Flask read caching and its
+# invalidation, single-flight locks, prefetch metrics and reading progress
+# rely on it. REDIS_URL (e.g. redis://127.0.0.1:6379/0) selects Redis; without
+# it each process has its own memory cache, fine for runserver, and
+# gunicorn.conf.py refuses to start more than one worker.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -121,3 +153,117 @@ FLASK_API_BASE_URL = "http://127.0.0.1:5000"
 LOGIN_REDIRECT_URL = "/"  # Redirect to story list after login
 LOGOUT_REDIRECT_URL = "/"  # Redirect to story list after logout
 LOGIN_URL = "/login/"
+
+# Raw Play rows older than this are deleted by `rollup_plays --compact`
+# (their counts are kept in the hourly/daily rollup tables)
+PLAY_RETENTION_DAYS = 90
+
+# Longest window the statistics time-series endpoint answers (rollups are
+# kept after compaction, so this may exceed PLAY_RETENTION_DAYS)
+STATS_TIMESERIES_MAX_DAYS = 3 * 365
+
+# The reading funnel endpoint scans every stored path of a story: its
+# answer is cached this long
+STATS_FUNNEL_CACHE_SECONDS = 10 * 60
+
+# A buffered reading path is saved as abandoned after this many idle seconds
+# (by the reader's next page view or `manage.py flush_reading_paths`, to be
+# run at least this often), and flushed early once it reaches
+# READING_SESSION_MAX_PAGES pages. A reader's buffers hold at most
+# READING_SESSION_MAX_TOTAL_PAGES pages across stories; beyond that the
+# least recently read paths are saved as abandoned.
+READING_SESSION_TIMEOUT = 30 * 60
+READING_SESSION_MAX_PAGES = 500
+READING_SESSION_MAX_TOTAL_PAGES = 1000
+
+# Saved reading positions are cached (CACHES) for this long, "no saved
+# position" for READING_PROGRESS_MISS_TIMEOUT, and written to the database
+# in batches of READING_PROGRESS_FLUSH_SIZE or every
+# READING_PROGRESS_FLUSH_INTERVAL seconds, whichever comes first
+READING_PROGRESS_CACHE_TIMEOUT = 10 * 60
+READING_PROGRESS_MISS_TIMEOUT = 60
+READING_PROGRESS_FLUSH_SIZE = 200
+READING_PROGRESS_FLUSH_INTERVAL = 30
+
+# After a write, the reader's requests keep reading from the primary
+# database for this many seconds (replica lag allowance)
+REPLICA_PIN_SECONDS = 10
+
+# Story create/edit runs as a background job (djangoapp.jobs): on a thread
+# pool inside the web process, or only via `manage.py run_jobs` when False
+STORY_JOBS_IN_PROCESS = True
+STORY_JOB_THREADS = 2
+# Jobs still running after this many seconds lost their worker and are
+# marked failed; jobs still queued after the sweep interval are picked up
+# again by the in-process pool (see djangoapp.jobs)
+STORY_JOB_TIMEOUT = 15 * 60
+STORY_JOB_SWEEP_INTERVAL = 60
+
+# Flask API client resilience (djangoapp.services.flask_api):
+# (connect, read) timeouts in seconds; the breaker opens when at least
+# `failure_rate` of the last `min_calls`+ calls within `window` seconds
+# failed, and probes again after `reset_timeout` seconds. While Flask is
+# unavailable, reads are served from the last good response for up to
+# FLASK_API_STALE_SECONDS.
+FLASK_API_TIMEOUT = (3.05, 10)
+FLASK_API_CIRCUIT_BREAKER = {
+    "failure_rate": 0.5,
+    "min_calls": 10,
+    "window": 30,
+    "reset_timeout": 15,
+}
+FLASK_API_STALE_SECONDS = 15 * 60
+
+# Flask answers 429 when its write rate limit is hit: wait Retry-After
+# (if no longer than FLASK_API_RATE_LIMIT_MAX_WAIT seconds) and retry
+FLASK_API_RATE_LIMIT_RETRIES = 3
+FLASK_API_RATE_LIMIT_MAX_WAIT = 5
+
+# Flask reads are cached for FLASK_API_CACHE_SECONDS (invalidated by writes
+# through the client to the same story, or to any story for story lists) and
+# refreshed single-flight: one upstream call
+# per key, other workers wait up to FLASK_API_LOCK_WAIT seconds for it.
+# FLASK_API_XFETCH_BETA > 1 refreshes hot keys earlier, < 1 later.
+FLASK_API_CACHE_SECONDS = 30
+FLASK_API_LOCK_TIMEOUT = 15
+FLASK_API_LOCK_WAIT = 2
+FLASK_API_XFETCH_BETA = 1.0
+
+# Next-page prefetching (djangoapp.prefetch): levels of choices followed
+# after each page view (0 disables), background threads per process, and
+# how many prefetches may queue before new ones are dropped. Warmed pages
+# and the `prefetch_stats` counters are in CACHES, so they need a shared
+# cache (REDIS_URL) to be seen across workers.
+PAGE_PREFETCH_DEPTH = 1
+PAGE_PREFETCH_THREADS = 2
+PAGE_PREFETCH_MAX_PENDING = 20
+
+# Published story snapshots are immutable (keyed by content hash), so
+# they can stay in the shared cache as long as it has room
+FLASK_SNAPSHOT_CACHE_SECONDS = 30 * 24 * 60 * 60
+
+# Author dashboard stats (djangoapp.dashboard), cached per author and
+# dropped on new plays, ratings and reports for their stories
+AUTHOR_DASHBOARD_CACHE_SECONDS = 10 * 60
+
+# Trending & recommendations (djangoapp.rankings, `manage.py refresh_rankings`):
+# plays lose half their weight every TRENDING_HALF_LIFE_HOURS; ratings are
+# smoothed towards the site mean as if every story had RANKING_RATING_PRIOR
+# extra mean votes (RANKING_DEFAULT_RATING before any rating exists)
+TRENDING_HALF_LIFE_HOURS = 72
+RANKING_RATING_PRIOR = 5
+RANKING_DEFAULT_RATING = 3
+STORY_RECOMMENDATIONS = 5
+
+# Write rate limits (djangoapp.ratelimit): scope -> (burst capacity, tokens
+# refilled per second), per signed-in user or, for anonymous requests, per
+# IP. Buckets are shared between workers through CACHES.
+# RATE_LIMIT_TRUSTED_PROXIES: number of reverse proxies in front of Django
+# that append to X-Forwarded-For (0: use the connection's address).
+RATE_LIMIT_STORE = "djangoapp.ratelimit.CacheStore"
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 0))
+RATE_LIMITS = {
+    "rate_story": (10, 10 / 60),  # 10 at once, then 10 a minute
+    "report_story": (5, 5 / 3600),  # 5 at once, then 5 an hour
+    "register": (5, 5 / 3600),  # per IP
+}
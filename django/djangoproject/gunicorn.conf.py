@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+
+# Production server profile: gunicorn -c gunicorn.conf.py
+#
+# Django is set up once in the master (preload_app) and forked into the
+# workers, so code and templates are shared copy-on-write. Database
+# connections and the pooled Flask API session must not cross that fork,
+# each worker starts with fresh ones.
+#
+# Reload: `kill -HUP <master>` restarts the workers gracefully with the
+# current config. With preloading, new code needs a fresh master:
+# `kill -USR2 <master>`, then `kill -QUIT <old master>` once the new one is up.
+
+wsgi_app = "djangoproject.wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(
+    os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+)
+preload_app = True
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+max_requests = 2000
+max_requests_jitter = 200
+
+
+def when_ready(server):
+    """Refuse to run several workers on per-process caches (settings.CACHES)"""
+    from djangoapp.services import coalesce
+
+    if server.cfg.workers > 1 and not coalesce.cache_is_shared():
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need a shared cache: set REDIS_URL "
+            "(or GUNICORN_WORKERS=1)"
+        )
+
+
+def post_fork(server, worker):
+    """Drop DB connections and HTTP keep-alive sockets inherited from the master,
+    then pick up story jobs a previous worker left behind"""
+    from django.db import connections
+    from djangoapp import jobs
+    from djangoapp.services import flask_api
+
+    connections.close_all()
+    flask_api.session.close()
+    jobs.sweep_if_due()
+
+
+def worker_exit(server, worker):
+    """Finish in-process story jobs and write buffered reading positions"""
+    from djangoapp import jobs, progress
+
+    jobs.shutdown()
+    progress.flush()
@@ -1,24 +1,38 @@
 from flask import Flask
 from config import Config
 from extensions import db, migrate
+import compression
+import ratelimit
+from serialization import FastJSONProvider
 
 
-def create_app():
+def create_app(config=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config)
+    app.json = FastJSONProvider(app)
 
     db.init_app(app)
     migrate.init_app(app, db)
+    compression.init_app(app)
+    ratelimit.init_app(app)
 
-    from models import Story, Page, Choice
+    from models import Story, Page, Choice, StorySnapshot, TextBlob
 
     from routes.stories import stories_bp
     from routes.pages import pages_bp
+    from routes.snapshots import snapshots_bp
 
     # Note: choice routes live inside pages_bp (/pages/<id>/choices)
 
     app.register_blueprint(stories_bp)
     app.register_blueprint(pages_bp)
+    app.register_blueprint(snapshots_bp)
+
+    from commands import gc_orphans, snapshot_published, text_storage_report
+
+    app.cli.add_command(gc_orphans)
+    app.cli.add_command(snapshot_published)
+    app.cli.add_command(text_storage_report)
 
     return app
 
@@ -0,0 +1,90 @@
+"""Serialization cost of 10k story rows: ORM + dicts vs Row tuples, stdlib vs orjson.
+
+Uses an in-memory SQLite database, so it never touches stories.db.
+
+Run from flask/flaskapi:  python benchmarks/bench_json_rows.py
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import select
+
+from extensions import db
+from models import Story
+from routes.stories import STORY_COLUMNS, story_to_dict
+from serialization import FastJSONProvider, orjson, to_builtin
+
+ROWS = 10_000
+ROUNDS = 20
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    return app
+
+
+def seed(rows=ROWS):
+    db.session.add_all(
+        Story(
+            title=f"Story {n}",
+            description="A short synthetic description for benchmarking. " * 3,
+            status="published" if n % 3 else "draft",
+            start_page_id=n,
+            author_id=n % 50 or None,
+        )
+        for n in range(1, rows + 1)
+    )
+    db.session.commit()
+
+
+def best_ms(func):
+    return min(timeit.repeat(func, number=1, repeat=ROUNDS)) * 1000
+
+
+def orm_stdlib():
+    db.session.expunge_all()
+    stories = Story.query.all()
+    return json.dumps([story_to_dict(story) for story in stories])
+
+
+def rows_stdlib():
+    rows = db.session.execute(select(*STORY_COLUMNS)).all()
+    return json.dumps(rows, default=to_builtin)
+
+
+def rows_provider(provider):
+    rows = db.session.execute(select(*STORY_COLUMNS)).all()
+    return provider.dumps(rows)
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed()
+        provider = FastJSONProvider(app)
+
+        results = [
+            ("ORM + story_to_dict + json", best_ms(orm_stdlib)),
+            ("Row + json", best_ms(rows_stdlib)),
+        ]
+        if orjson is not None:
+            results.append(("Row + orjson", best_ms(lambda: rows_provider(provider))))
+        else:
+            print("orjson not installed, skipping the orjson run")
+
+    print(f"{ROWS} rows (query + serialize), best of {ROUNDS} runs")
+    for name, ms in results:
+        print(f"{name:<30}{ms:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
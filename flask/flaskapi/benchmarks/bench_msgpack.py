@@ -0,0 +1,72 @@
+"""JSON vs MessagePack for a synthetic 10k-page GET /stories/<id>/pages payload.
+
+Run from flask/flaskapi:  python benchmarks/bench_msgpack.py
+"""
+
+import json
+import random
+import timeit
+
+import msgpack
+
+PAGES = 10_000
+ROUNDS = 20
+
+
+def synthetic_story_pages(pages=PAGES, seed=42):
+    """Same shape as the story_pages() response"""
+    rng = random.Random(seed)
+    words = "the forest path lantern cabin figure shadow map door river".split()
+    return [
+        {
+            "id": page_id,
+            "text": " ".join(rng.choice(words) for _ in range(rng.randint(20, 120))),
+            "is_ending": page_id % 10 == 0,
+            "ending_label": f"Ending {page_id}" if page_id % 10 == 0 else None,
+            "is_start": page_id == 1,
+            "choices": [
+                {
+                    "id": page_id * 10 + n,
+                    "text": f"Go to {rng.choice(words)}",
+                    "next_page_id": rng.randint(1, pages),
+                }
+                for n in range(0 if page_id % 10 == 0 else rng.randint(1, 3))
+            ],
+        }
+        for page_id in range(1, pages + 1)
+    ]
+
+
+def best_ms(func):
+    return min(timeit.repeat(func, number=1, repeat=ROUNDS)) * 1000
+
+
+def main():
+    payload = synthetic_story_pages()
+
+    as_json = json.dumps(payload).encode()
+    as_msgpack = msgpack.packb(payload, use_bin_type=True)
+
+    rows = [
+        (
+            "json",
+            best_ms(lambda: json.dumps(payload).encode()),
+            best_ms(lambda: json.loads(as_json)),
+            len(as_json),
+        ),
+        (
+            "msgpack",
+            best_ms(lambda: msgpack.packb(payload, use_bin_type=True)),
+            best_ms(lambda: msgpack.unpackb(as_msgpack, strict_map_key=False)),
+            len(as_msgpack),
+        ),
+    ]
+
+    print(f"{PAGES} pages, best of {ROUNDS} runs")
+    print(f"{'format':<10}{'encode ms':>12}{'decode ms':>12}{'bytes':>12}")
+    for name, encode_ms, decode_ms, size in rows:
+        print(f"{name:<10}{encode_ms:>12.2f}{decode_ms:>12.2f}{size:>12,}")
+
+
+if __name__ == "__main__":
+    main()
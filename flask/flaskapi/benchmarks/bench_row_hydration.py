@@ -0,0 +1,136 @@
+"""ORM instance hydration vs Core column rows for the read endpoints, 100k rows.
+
+Measures wall time and peak Python allocation (tracemalloc) of loading the
+rows only — serialization is covered by bench_json_rows.py. Uses an
+in-memory SQLite database, so it never touches stories.db.
+
+Run from flask/flaskapi:  python benchmarks/bench_row_hydration.py
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, select
+
+from extensions import db
+from models import Story, Page, Choice, TextBlob
+from routes.stories import STORY_COLUMNS, PAGE_COLUMNS, CHOICE_COLUMNS
+
+ROWS = 100_000
+ROUNDS = 3
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    return app
+
+
+def seed(rows=ROWS):
+    """`rows` stories, and one story with `rows` pages and `rows` choices"""
+    db.session.execute(
+        insert(Story),
+        [
+            {
+                "title": f"Story {n}",
+                "description": "A short synthetic description. " * 3,
+                "status": "published",
+                "start_page_id": 1,
+            }
+            for n in range(1, rows + 1)
+        ],
+    )
+    texts = [f"Page {n} text. " * 10 for n in range(1, rows + 1)]
+    db.session.execute(
+        insert(TextBlob),
+        [
+            {"hash": TextBlob.digest(text), "body": text, "size": len(text.encode())}
+            for text in texts
+        ],
+    )
+    db.session.execute(
+        insert(Page),
+        [
+            {
+                "story_id": 1,
+                "text_hash": TextBlob.digest(text),
+                "is_ending": n % 10 == 0,
+            }
+            for n, text in enumerate(texts, 1)
+        ],
+    )
+    db.session.execute(
+        insert(Choice),
+        [
+            {"page_id": n, "text": f"Go to {n + 1}", "next_page_id": n + 1}
+            for n in range(1, rows + 1)
+        ],
+    )
+    db.session.commit()
+
+
+def measure(load):
+    """Best wall time and peak allocation over ROUNDS fresh sessions"""
+    best_s, best_peak = float("inf"), float("inf")
+    for _ in range(ROUNDS):
+        db.session.remove()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = load()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        best_s, best_peak = min(best_s, elapsed), min(best_peak, peak)
+    return best_s * 1000, best_peak / 2**20
+
+
+CASES = [
+    ("stories: ORM", lambda: Story.query.all()),
+    ("stories: rows", lambda: db.session.execute(select(*STORY_COLUMNS)).all()),
+    (
+        "pages+choices: ORM",
+        lambda: (
+            Page.query.filter_by(story_id=1).all(),
+            Choice.query.join(Page, Page.id == Choice.page_id)
+            .filter(Page.story_id == 1)
+            .all(),
+        ),
+    ),
+    (
+        "pages+choices: rows",
+        lambda: (
+            db.session.execute(
+                select(*PAGE_COLUMNS).where(Page.story_id == 1)
+            ).all(),
+            db.session.execute(
+                select(*CHOICE_COLUMNS)
+                .join(Page, Page.id == Choice.page_id)
+                .where(Page.story_id == 1)
+            ).all(),
+        ),
+    ),
+]
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed()
+        results = [(name, *measure(load)) for name, load in CASES]
+
+    print(f"{ROWS:,} rows per table, best of {ROUNDS} runs")
+    print(f"{'case':<24}{'ms':>10}{'peak MiB':>12}")
+    for name, ms, peak in results:
+        print(f"{name:<24}{ms:>10.1f}{peak:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
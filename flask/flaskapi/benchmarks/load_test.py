@@ -0,0 +1,92 @@
+"""Throughput of the gunicorn profile for 1, 2, 4 ... workers.
+
+Starts `gunicorn -c gunicorn.conf.py` once per worker count, drives it with
+CLIENTS concurrent client processes for SECONDS, and prints requests/s.
+Only issues GET requests, so it is safe to run against stories.db.
+
+Run from flask/flaskapi:
+    python benchmarks/load_test.py [--workers 1 2 4] [--path /stories/1/pages]
+"""
+
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+BIND = "127.0.0.1:5099"
+CLIENTS = 8
+SECONDS = 10
+
+
+def wait_until_up(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not come up on {url}")
+
+
+def client(url, seconds):
+    """Keep-alive client: returns (ok, errors) after `seconds`"""
+    session = requests.Session()
+    ok = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            response = session.get(url, timeout=10)
+            ok += response.status_code == 200
+            errors += response.status_code != 200
+        except requests.RequestException:
+            errors += 1
+    return ok, errors
+
+
+def run(workers, path, clients, seconds):
+    env = {**os.environ, "GUNICORN_WORKERS": str(workers), "GUNICORN_BIND": BIND}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://{BIND}{path}"
+    try:
+        wait_until_up(url)
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.starmap(client, [(url, seconds)] * clients)
+    finally:
+        server.terminate()
+        server.wait()
+
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return ok / seconds, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/stories/1/pages")
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--seconds", type=int, default=SECONDS)
+    args = parser.parse_args()
+
+    print(
+        f"GET {args.path}, {args.clients} clients, {args.seconds}s per run, "
+        f"{os.cpu_count()} CPUs"
+    )
+    print(f"{'workers':>8}{'req/s':>12}{'errors':>10}")
+    for workers in args.workers:
+        rps, errors = run(workers, args.path, args.clients, args.seconds)
+        print(f"{workers:>8}{rps:>12.1f}{errors:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, delete
+
+from extensions import db
+from models import Story, Page, Choice, StorySnapshot, TextBlob
+import snapshots
+
+NO_SYNC = {"synchronize_session": False}
+
+
+def delete_pages(ids):
+    # Children first: databases migrated before ON DELETE CASCADE have none
+    db.session.execute(
+        delete(Choice).where(Choice.page_id.in_(ids)), execution_options=NO_SYNC
+    )
+    db.session.execute(delete(Page).where(Page.id.in_(ids)), execution_options=NO_SYNC)
+
+
+def delete_choices(ids):
+    db.session.execute(
+        delete(Choice).where(Choice.id.in_(ids)), execution_options=NO_SYNC
+    )
+
+
+def delete_text_blobs(hashes):
+    # Checked again here: a page may have started using the text since
+    db.session.execute(
+        delete(TextBlob).where(
+            TextBlob.hash.in_(hashes), TextBlob.hash.not_in(select(Page.text_hash))
+        ),
+        execution_options=NO_SYNC,
+    )
+
+
+# Snapshot hashes readers may be sent to (NOT IN must not see a NULL)
+referenced_snapshots = select(Story.snapshot_hash).where(
+    Story.snapshot_hash.is_not(None)
+)
+
+
+def delete_snapshots(ids):
+    # Checked again here: a story may have been published with it since
+    db.session.execute(
+        delete(StorySnapshot).where(
+            StorySnapshot.id.in_(ids),
+            StorySnapshot.content_hash.not_in(referenced_snapshots),
+        ),
+        execution_options=NO_SYNC,
+    )
+
+
+def unreferenced_snapshots(grace):
+    """Snapshots no story points at, older than `grace` seconds"""
+    # created_at is naive UTC (CURRENT_TIMESTAMP)
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=grace)
+    return select(StorySnapshot.id).where(
+        StorySnapshot.content_hash.not_in(referenced_snapshots),
+        StorySnapshot.created_at < cutoff,
+    )
+
+
+# (label, select of orphan ids, batch delete), in dependency order
+ORPHANS = [
+    (
+        "pages without a story",
+        select(Page.id).where(Page.story_id.not_in(select(Story.id))),
+        delete_pages,
+    ),
+    (
+        "choices without a page",
+        select(Choice.id).where(Choice.page_id.not_in(select(Page.id))),
+        delete_choices,
+    ),
+    (
+        "choices leading to a missing page",
+        select(Choice.id).where(Choice.next_page_id.not_in(select(Page.id))),
+        delete_choices,
+    ),
+    (
+        "page texts no page uses",
+        select(TextBlob.hash).where(TextBlob.hash.not_in(select(Page.text_hash))),
+        delete_text_blobs,
+    ),
+]
+
+
+@click.command("gc-orphans")
+@click.option("--batch-size", default=1000, show_default=True)
+@with_appcontext
+def gc_orphans(batch_size):
+    """Delete orphaned pages/choices/texts/snapshots and dangling choice edges."""
+    grace = current_app.config["SNAPSHOT_GC_GRACE"]
+    superseded = ("snapshots no story points at", unreferenced_snapshots(grace))
+    for label, orphans, purge in ORPHANS + [(*superseded, delete_snapshots)]:
+        removed = 0
+        while True:
+            ids = db.session.scalars(orphans.limit(batch_size)).all()
+            if not ids:
+                break
+            purge(ids)
+            db.session.commit()
+            removed += len(ids)
+            click.echo(f"  {label}: {removed} removed so far")
+        click.echo(f"{label}: {removed} removed")
+
+
+@click.command("snapshot-published")
+@with_appcontext
+def snapshot_published():
+    """Freeze a snapshot for published stories that have none yet."""
+    ids = db.session.scalars(
+        select(Story.id).where(
+            Story.status == "published", Story.snapshot_hash.is_(None)
+        )
+    ).all()
+    for story_id in ids:
+        snapshots.publish(story_id)
+        db.session.commit()
+    click.echo(f"{len(ids)} published stories snapshotted")
+
+
+@click.command("text-storage-report")
+@with_appcontext
+def text_storage_report():
+    """Page text storage: logical size vs. deduplicated, compressed blobs."""
+    pages, logical = db.session.execute(
+        select(func.count(Page.id), func.coalesce(func.sum(TextBlob.size), 0)).join(
+            TextBlob, TextBlob.hash == Page.text_hash
+        )
+    ).one()
+    blobs, unique, stored = db.session.execute(
+        select(
+            func.count(TextBlob.hash),
+            func.coalesce(func.sum(TextBlob.size), 0),
+            func.coalesce(func.sum(func.length(TextBlob.body)), 0),
+        )
+    ).one()
+
+    def share(saved):
+        return f"{saved / logical:.1%}" if logical else "-"
+
+    click.echo(f"pages:               {pages}")
+    click.echo(f"distinct texts:      {blobs}")
+    click.echo(f"text as written:     {logical} bytes")
+    click.echo(f"after deduplication: {unique} bytes ({share(logical - unique)} saved)")
+    click.echo(f"stored (compressed): {stored} bytes ({share(logical - stored)} saved)")
@@ -0,0 +1,99 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip only
+    zstandard = None
+
+# Response compression
+# Bodies of at least COMPRESS_MIN_SIZE bytes are gzip/zstd encoded when the
+# client accepts it. Compressed bodies are kept in a small LRU keyed by
+# (ETag, encoding), so repeated requests for an unchanged payload (e.g. a
+# whole story from story_pages) skip recompression.
+
+
+class CompressedCache:
+    """Thread-safe LRU of compressed bodies, bounded by total bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def available_encodings():
+    """Supported encodings, most preferred first"""
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def compress(body, encoding, level):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    return gzip.compress(body, compresslevel=level)
+
+
+def init_app(app):
+    app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+    app.config.setdefault("COMPRESS_LEVEL", 6)
+    app.config.setdefault("COMPRESS_CACHE_BYTES", 64 * 1024 * 1024)
+
+    cache = CompressedCache(app.config["COMPRESS_CACHE_BYTES"])
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            request.method != "GET"
+            or response.status_code != 200
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = next(
+            (e for e in available_encodings() if e in request.accept_encodings),
+            None,
+        )
+        too_small = (response.content_length or 0) < app.config["COMPRESS_MIN_SIZE"]
+        if encoding is None or too_small:
+            return response
+
+        # A compressed body is a different representation: give it its own
+        # strong ETag, derived from the hash of the uncompressed body
+        response.add_etag()
+        etag, _ = response.get_etag()
+        key = (etag, encoding)
+
+        body = cache.get(key)
+        if body is None:
+            body = compress(response.get_data(), encoding, app.config["COMPRESS_LEVEL"])
+            cache.set(key, body)
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        response.set_etag(f"{etag}-{encoding}")
+        return response.make_conditional(request)
@@ -2,6 +2,69 @@ import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+
+def normalize_url(url):
+    # Hosting providers still hand out the pre-SQLAlchemy-1.4 scheme
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://") :]
+    return url
+
+
+def database_url():
+    """DATABASE_URL from the environment, local SQLite file otherwise"""
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        return "sqlite:///" + os.path.join(BASE_DIR, "stories.db")
+    return normalize_url(url)
+
+
+def database_binds():
+    """Extra engines: REPLICA_DATABASE_URL becomes the "replica" bind"""
+    url = os.environ.get("REPLICA_DATABASE_URL")
+    if not url:
+        return {}
+    return {"replica": normalize_url(url)}
+
+
+def engine_options():
+    """Connection pool settings, each overridable from the environment.
+
+    pool_size / max_overflow / pool_timeout only apply to queue pools, so
+    they are left to SQLAlchemy's defaults unless set explicitly.
+    """
+    options = {
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") != "0",
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),  # seconds
+    }
+    for option, variable in [
+        ("pool_size", "DB_POOL_SIZE"),
+        ("max_overflow", "DB_MAX_OVERFLOW"),
+        ("pool_timeout", "DB_POOL_TIMEOUT"),
+    ]:
+        if os.environ.get(variable):
+            options[option] = int(os.environ[variable])
+    return options
+
+
 class Config:
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(BASE_DIR, "stories.db")
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_BINDS = database_binds()  # see extensions.RoutingSession
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    PAGES_BATCH_MAX = 100  # ids per GET /pages?ids= call
+    STORIES_BATCH_MAX = 100  # ids per PUT /stories/status call
+
+    # Replaced snapshots stay fetchable this long before gc-orphans deletes them
+    SNAPSHOT_GC_GRACE = 24 * 60 * 60  # seconds
+
+    # Write rate limit per client / IP (see ratelimit.py): bursts of up to
+    # RATE_LIMIT_CAPACITY writes, refilled at RATE_LIMIT_PER_SECOND
+    RATE_LIMIT_CAPACITY = int(os.environ.get("RATE_LIMIT_CAPACITY", 300))
+    RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", 50))
+    RATE_LIMIT_STORE = "ratelimit.LocalStore"
+
+    # Response compression (see compression.py)
+    COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are sent as-is
+    COMPRESS_LEVEL = 6
+    COMPRESS_CACHE_BYTES = 64 * 1024 * 1024  # compressed bodies kept by ETag
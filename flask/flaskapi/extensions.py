@@ -1,5 +1,61 @@
+import sqlite3
+
+from flask import abort, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REPLICA_BIND = "replica"
+READ_PRIMARY_HEADER = "X-Read-Primary"
+
+
+class RoutingSession(Session):
+    """Send SELECTs of read-only requests to the replica bind, if configured.
+
+    Everything else stays on the primary: writes, all statements of
+    non-GET requests (they read what they are about to change), CLI
+    commands, and requests from clients asking to read their own writes
+    via the X-Read-Primary header.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and clause is not None
+            and clause.is_select
+            and REPLICA_BIND in self._db.engines
+            and reads_from_replica()
+        ):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 
-db = SQLAlchemy()
+def reads_from_replica():
+    return (
+        has_request_context()
+        and request.method in ("GET", "HEAD")
+        and not request.headers.get(READ_PRIMARY_HEADER)
+    )
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
+
+
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores FOREIGN KEY / ON DELETE CASCADE unless asked per connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def row_or_404(statement):
+    """First row of a Core select, or abort(404) — get_or_404 without the ORM"""
+    row = db.session.execute(statement).first()
+    if row is None:
+        abort(404)
+    return row
@@ -0,0 +1,38 @@
+import multiprocessing
+import os
+
+# Production server profile: gunicorn -c gunicorn.conf.py
+#
+# The app is imported once in the master (preload_app) and forked into the
+# workers, so code and read-only data are shared copy-on-write. Database
+# connections must not cross that fork: each worker drops the pool it
+# inherited and opens its own connections.
+#
+# Reload: `kill -HUP <master>` restarts the workers gracefully with the
+# current config. With preloading, new code needs a fresh master:
+# `kill -USR2 <master>`, then `kill -QUIT <old master>` once the new one is up.
+
+wsgi_app = "wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:5000")
+workers = int(
+    os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+)
+preload_app = True
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to cap memory growth (compressed-body cache)
+max_requests = 2000
+max_requests_jitter = 200
+
+
+def post_fork(server, worker):
+    """Forget the engines' inherited SQLite/DB connections in this worker"""
+    from wsgi import app
+    from extensions import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
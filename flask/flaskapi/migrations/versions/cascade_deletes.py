@@ -0,0 +1,76 @@
+"""ON DELETE CASCADE foreign keys and indexes for bulk deletes
+
+Revision ID: cascade_deletes_002
+Revises: add_author_id_001
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "cascade_deletes_002"
+down_revision = "add_author_id_001"
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table, name of the new constraint)
+FOREIGN_KEYS = [
+    ("page", "story_id", "story", "fk_page_story_id_story"),
+    ("choice", "page_id", "page", "fk_choice_page_id_page"),
+]
+
+
+def existing_fk_name(table, column, referred):
+    """Name of the current FK on `column`.
+
+    The initial migration created unnamed constraints: SQLite reports them
+    with no name (batch mode then uses the naming convention below), other
+    backends report the name they generated. Offline (--sql) runs cannot
+    inspect, so they assume SQLite's / PostgreSQL's defaults.
+    """
+    if context.is_offline_mode():
+        if op.get_bind().dialect.name == "sqlite":
+            return f"fk_{table}_{column}_{referred}"
+        return f"{table}_{column}_fkey"
+
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if fk["constrained_columns"] == [column]:
+            return fk["name"] or f"fk_{table}_{column}_{referred}"
+    return None
+
+
+def replace_foreign_keys(ondelete):
+    for table, column, referred, name in FOREIGN_KEYS:
+        old_name = existing_fk_name(table, column, referred)
+        with op.batch_alter_table(
+            table,
+            naming_convention={
+                "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"
+            },
+        ) as batch_op:
+            if old_name:
+                batch_op.drop_constraint(old_name, type_="foreignkey")
+            batch_op.create_foreign_key(
+                name, referred, [column], ["id"], ondelete=ondelete
+            )
+
+
+def upgrade():
+    # Rows left behind by earlier deletes would violate the constraints
+    op.execute("DELETE FROM page WHERE story_id NOT IN (SELECT id FROM story)")
+    op.execute("DELETE FROM choice WHERE page_id NOT IN (SELECT id FROM page)")
+    op.execute("DELETE FROM choice WHERE next_page_id NOT IN (SELECT id FROM page)")
+
+    replace_foreign_keys(ondelete="CASCADE")
+
+    op.create_index("ix_page_story_id", "page", ["story_id"])
+    op.create_index("ix_choice_page_id", "choice", ["page_id"])
+    op.create_index("ix_choice_next_page_id", "choice", ["next_page_id"])
+
+
+def downgrade():
+    op.drop_index("ix_choice_next_page_id", table_name="choice")
+    op.drop_index("ix_choice_page_id", table_name="choice")
+    op.drop_index("ix_page_story_id", table_name="page")
+
+    replace_foreign_keys(ondelete=None)
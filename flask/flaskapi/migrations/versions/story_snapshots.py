@@ -0,0 +1,46 @@
+"""Immutable published story snapshots
+
+Revision ID: story_snapshots_003
+Revises: cascade_deletes_002
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "story_snapshots_003"
+down_revision = "cascade_deletes_002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "story_snapshot",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("story_id", sa.Integer(), nullable=False),
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+        sa.ForeignKeyConstraint(
+            ["story_id"],
+            ["story.id"],
+            name="fk_story_snapshot_story_id_story",
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("content_hash", name="uq_story_snapshot_content_hash"),
+    )
+    op.create_index("ix_story_snapshot_story_id", "story_snapshot", ["story_id"])
+    op.add_column(
+        "story", sa.Column("snapshot_hash", sa.String(length=64), nullable=True)
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("story") as batch_op:
+        batch_op.drop_column("snapshot_hash")
+    op.drop_index("ix_story_snapshot_story_id", table_name="story_snapshot")
+    op.drop_table("story_snapshot")
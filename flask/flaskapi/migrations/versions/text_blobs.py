@@ -0,0 +1,163 @@
+"""Content-addressed page text (text_blob)
+
+Revision ID: text_blobs_004
+Revises: story_snapshots_003
+Create Date: 2026-10-19 00:00:00.000000
+"""
+
+import hashlib
+import zlib
+
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "text_blobs_004"
+down_revision = "story_snapshots_003"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# text_blob.body as this revision writes it (see models.CompressedText),
+# kept here so later changes to the model can't change this migration:
+# a tag byte, then raw UTF-8 under MIN_SIZE bytes, zlib otherwise
+MIN_SIZE = 256
+
+text_blob = sa.table(
+    "text_blob",
+    sa.column("hash", sa.String),
+    sa.column("body", sa.LargeBinary),
+    sa.column("size", sa.Integer),
+)
+page = sa.table(
+    "page",
+    sa.column("id", sa.Integer),
+    sa.column("text", sa.Text),
+    sa.column("text_hash", sa.String),
+)
+
+
+def upgrade():
+    op.create_table(
+        "text_blob",
+        sa.Column("hash", sa.String(length=64), nullable=False),
+        sa.Column("body", sa.LargeBinary(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("hash"),
+    )
+    op.add_column("page", sa.Column("text_hash", sa.String(length=64), nullable=True))
+
+    if context.is_offline_mode():
+        # No Python in a --sql script: hash in SQL, store bodies uncompressed
+        op.execute(
+            "INSERT INTO text_blob (hash, body, size) "
+            "SELECT DISTINCT encode(sha256(convert_to(text, 'UTF8')), 'hex'), "
+            "'r'::bytea || convert_to(text, 'UTF8'), octet_length(text) FROM page"
+        )
+        op.execute(
+            "UPDATE page SET text_hash = encode(sha256(convert_to(text, 'UTF8')), 'hex')"
+        )
+    else:
+        _move_text_to_blobs(op.get_bind())
+
+    with op.batch_alter_table("page") as batch_op:
+        batch_op.alter_column(
+            "text_hash", existing_type=sa.String(length=64), nullable=False
+        )
+        batch_op.create_index("ix_page_text_hash", ["text_hash"])
+        batch_op.create_foreign_key(
+            "fk_page_text_hash_text_blob", "text_blob", ["text_hash"], ["hash"]
+        )
+        batch_op.drop_column("text")
+
+
+def downgrade():
+    op.add_column("page", sa.Column("text", sa.Text(), nullable=True))
+
+    if context.is_offline_mode():
+        raise RuntimeError("Decompressing page text needs a live database connection")
+    _move_blobs_to_text(op.get_bind())
+
+    with op.batch_alter_table("page") as batch_op:
+        batch_op.alter_column("text", existing_type=sa.Text(), nullable=False)
+        batch_op.drop_constraint("fk_page_text_hash_text_blob", type_="foreignkey")
+        batch_op.drop_index("ix_page_text_hash")
+        batch_op.drop_column("text_hash")
+    op.drop_table("text_blob")
+
+
+def _move_text_to_blobs(bind):
+    # Keyset batches over page ids; each distinct body is stored once
+    seen = set()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(page.c.id, page.c.text)
+            .where(page.c.id > last_id)
+            .order_by(page.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        blobs, hashes = [], []
+        for row in rows:
+            key = hashlib.sha256(row.text.encode()).hexdigest()
+            hashes.append({"page_id": row.id, "key": key})
+            if key not in seen:
+                seen.add(key)
+                blobs.append(
+                    {
+                        "hash": key,
+                        "body": _encode(row.text),
+                        "size": len(row.text.encode()),
+                    }
+                )
+        if blobs:
+            bind.execute(text_blob.insert(), blobs)
+        bind.execute(
+            page.update()
+            .where(page.c.id == sa.bindparam("page_id"))
+            .values(text_hash=sa.bindparam("key")),
+            hashes,
+        )
+        last_id = rows[-1].id
+
+
+def _move_blobs_to_text(bind):
+    # Bodies are decompressed here, not in SQL
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(page.c.id, text_blob.c.body)
+            .join(text_blob, text_blob.c.hash == page.c.text_hash)
+            .where(page.c.id > last_id)
+            .order_by(page.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            page.update()
+            .where(page.c.id == sa.bindparam("page_id"))
+            .values(text=sa.bindparam("body")),
+            [{"page_id": row.id, "body": _decode(row.body)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def _encode(text):
+    data = text.encode()
+    if len(data) < MIN_SIZE:
+        return b"r" + data
+    return b"z" + zlib.compress(data, 9)
+
+
+def _decode(body):
+    tag, data = bytes(body[:1]), bytes(body[1:])
+    if tag == b"z":
+        data = zlib.decompress(data)
+    elif tag == b"s":  # written by the app with zstandard installed
+        import zstandard
+
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode()
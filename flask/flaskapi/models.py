@@ -1,5 +1,59 @@
+import hashlib
+import zlib
+
+from sqlalchemy import LargeBinary, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.types import TypeDecorator
+
 from extensions import db
 
+try:
+    import zstandard
+except ImportError:  # optional: zlib only
+    zstandard = None
+
+
+# Stored text compression
+# Column values are one tag byte followed by the payload: raw UTF-8 for
+# bodies under `min_size` bytes, zstd (when installed) or zlib otherwise.
+# The tag is read back, so rows written with either codec stay readable;
+# zstd rows do need zstandard installed.
+
+RAW, ZLIB, ZSTD = b"r", b"z", b"s"
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored as (optionally compressed) bytes"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, min_size=256, level=9):
+        super().__init__()
+        self.min_size = min_size
+        self.level = level
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        data = value.encode()
+        if len(data) < self.min_size:
+            return RAW + data
+        if zstandard is not None:
+            return ZSTD + zstandard.ZstdCompressor(level=self.level).compress(data)
+        return ZLIB + zlib.compress(data, self.level)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        tag, data = bytes(value[:1]), value[1:]
+        if tag == ZSTD:
+            data = zstandard.ZstdDecompressor().decompress(data)
+        elif tag == ZLIB:
+            data = zlib.decompress(data)
+        return bytes(data).decode()
+
 
 class Story(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -8,18 +62,96 @@ class Story(db.Model):
     status = db.Column(db.String(20), default="draft")
     start_page_id = db.Column(db.Integer)
     author_id = db.Column(db.Integer, nullable=True)  # Django User.id of the author
+    # Published snapshot readers are served (None until first published)
+    snapshot_hash = db.Column(db.String(64), nullable=True)
+
+
+class TextBlob(db.Model):
+    """Page text stored once per distinct body, keyed by its sha256"""
+
+    hash = db.Column(db.String(64), primary_key=True)
+    body = db.Column(CompressedText(min_size=256), nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # UTF-8 bytes, uncompressed
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @classmethod
+    def intern(cls, text):
+        """The blob holding `text`, inserted if no page uses it yet"""
+        key = cls.digest(text)
+        blob = db.session.get(cls, key)
+        if blob is None:
+            blob = cls(hash=key, body=text, size=len(text.encode()))
+            try:
+                with db.session.begin_nested():
+                    db.session.add(blob)
+            except IntegrityError:  # stored concurrently
+                blob = db.session.get(cls, key)
+        return blob
 
 
 class Page(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    story_id = db.Column(db.Integer, db.ForeignKey("story.id"), nullable=False)
-    text = db.Column(db.Text, nullable=False)
+    story_id = db.Column(
+        db.Integer,
+        db.ForeignKey("story.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # Text lives in text_blob, shared by every page with the same body
+    text_hash = db.Column(
+        db.String(64), db.ForeignKey("text_blob.hash"), nullable=False, index=True
+    )
+    blob = db.relationship(TextBlob, lazy="joined")
     is_ending = db.Column(db.Boolean, default=False)
     ending_label = db.Column(db.String(100))
 
+    @hybrid_property
+    def text(self):
+        return self.blob.body if self.blob is not None else None
+
+    @text.inplace.setter
+    def _text_setter(self, value):
+        self.blob = TextBlob.intern(value)
+
+    @text.inplace.expression
+    @classmethod
+    def _text_expression(cls):
+        # Correlated lookup, so row selects of Page.text still get the text
+        return (
+            select(TextBlob.body)
+            .where(TextBlob.hash == cls.text_hash)
+            .scalar_subquery()
+            .label("text")
+        )
+
 
 class Choice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    page_id = db.Column(db.Integer, db.ForeignKey("page.id"), nullable=False)
+    page_id = db.Column(
+        db.Integer,
+        db.ForeignKey("page.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
     text = db.Column(db.String(200), nullable=False)
-    next_page_id = db.Column(db.Integer, nullable=False)
+    # Not a FK (may point at any page): dangling edges are deleted in bulk
+    next_page_id = db.Column(db.Integer, nullable=False, index=True)
+
+
+class StorySnapshot(db.Model):
+    """Immutable copy of a story's page graph, frozen on publish (snapshots.py)"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    story_id = db.Column(
+        db.Integer,
+        db.ForeignKey("story.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # sha256 of the uncompressed JSON: identical content is stored once
+    content_hash = db.Column(db.String(64), nullable=False, unique=True)
+    data = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
@@ -0,0 +1,79 @@
+import math
+import os
+import threading
+import time
+
+from flask import current_app, jsonify, request
+from werkzeug.utils import import_string
+
+API_KEY = os.environ.get("FLASK_API_KEY", "Stories")
+
+# Token-bucket rate limiting for the write endpoints
+# Every client has a bucket of RATE_LIMIT_CAPACITY tokens refilled at
+# RATE_LIMIT_PER_SECOND; each write takes one or is answered 429 with
+# Retry-After. Callers with the API key are limited per X-Client-Id (Django
+# sends the author a story job writes for), so one large job doesn't starve
+# other authors' saves; callers without it by IP address (so guessing keys
+# doesn't buy fresh buckets).
+#
+# RATE_LIMIT_STORE names the bucket store class. LocalStore keeps buckets
+# in process memory, spread over striped locks so concurrent requests
+# rarely contend; a shared store (e.g. on Redis) only needs the same
+# take(key, capacity, per_second) method.
+
+
+class LocalStore:
+    """In-process buckets, at most `max_keys` (least recently used dropped)"""
+
+    def __init__(self, stripes=64, max_keys=100_000):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._buckets = [{} for _ in range(stripes)]
+        self._max_keys = max(max_keys // stripes, 1)
+
+    def take(self, key, capacity, per_second):
+        """Take a token: 0 if allowed, else seconds until one is available"""
+        stripe = hash(key) % len(self._locks)
+        buckets = self._buckets[stripe]
+        now = time.monotonic()
+        with self._locks[stripe]:
+            tokens, updated = buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * per_second)
+            if tokens >= 1:
+                tokens, wait = tokens - 1, 0
+            else:
+                wait = (1 - tokens) / per_second
+            buckets[key] = (tokens, now)  # re-inserted: most recently used
+            if len(buckets) > self._max_keys:
+                del buckets[next(iter(buckets))]
+        return wait
+
+
+def init_app(app):
+    app.config.setdefault("RATE_LIMIT_CAPACITY", 300)
+    app.config.setdefault("RATE_LIMIT_PER_SECOND", 50.0)
+    app.config.setdefault("RATE_LIMIT_STORE", "ratelimit.LocalStore")
+    app.extensions["ratelimit"] = import_string(app.config["RATE_LIMIT_STORE"])()
+
+
+def limit_writes():
+    """before_request hook for blueprints with write endpoints"""
+    if request.method in ("GET", "HEAD", "OPTIONS"):
+        return None
+
+    if request.headers.get("X-API-KEY") == API_KEY:
+        client = f"key:{request.headers.get('X-Client-Id', '')}"
+    else:
+        client = f"ip:{request.remote_addr}"
+    wait = current_app.extensions["ratelimit"].take(
+        client,
+        current_app.config["RATE_LIMIT_CAPACITY"],
+        current_app.config["RATE_LIMIT_PER_SECOND"],
+    )
+    if not wait:
+        return None
+
+    seconds = math.ceil(wait)
+    response = jsonify({"error": "Too many requests", "retry_after": seconds})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(seconds)
+    return response
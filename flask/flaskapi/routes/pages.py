@@ -1,13 +1,20 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request, abort
+from sqlalchemy import select, delete
 from models import Page, Choice
-from extensions import db
+from extensions import db, row_or_404
+from serialization import respond
+import ratelimit
 
 pages_bp = Blueprint("pages", __name__, url_prefix="/pages")
+pages_bp.before_request(ratelimit.limit_writes)
 
 import os
 
 API_KEY = os.environ.get("FLASK_API_KEY", "Stories")
 
+# Bulk UPDATE/DELETE statements skip syncing the identity map
+NO_SYNC = {"synchronize_session": False}
+
 
 def require_api_key(func):
     def wrapper(*args, **kwargs):
@@ -20,30 +27,54 @@ def require_api_key(func):
     return wrapper
 
 
+# Column projections for the read endpoints
+PAGE_COLUMNS = (Page.id, Page.story_id, Page.text, Page.is_ending, Page.ending_label)
+CHOICE_COLUMNS = (Choice.id, Choice.page_id, Choice.text, Choice.next_page_id)
+
+
+@pages_bp.route("", methods=["GET"])
+def get_pages():
+    """GET /pages?ids=1,2,3 - Several pages + their choices, in `ids` order.
+
+    Unknown ids are left out. At most PAGES_BATCH_MAX ids per call.
+    """
+    try:
+        ids = list(dict.fromkeys(int(i) for i in request.args["ids"].split(",") if i))
+    except (KeyError, ValueError):
+        return jsonify({"error": "ids must be a comma-separated list of page ids"}), 400
+    limit = current_app.config["PAGES_BATCH_MAX"]
+    if len(ids) > limit:
+        return jsonify({"error": f"At most {limit} ids per request"}), 400
+
+    pages = db.session.execute(select(*PAGE_COLUMNS).where(Page.id.in_(ids))).all()
+    choices = db.session.execute(
+        select(*CHOICE_COLUMNS).where(Choice.page_id.in_(ids)).order_by(Choice.id)
+    ).all()
+
+    choices_by_page = {}
+    for choice in choices:
+        choices_by_page.setdefault(choice.page_id, []).append(choice)
+
+    by_id = {page.id: page for page in pages}
+    return respond(
+        [
+            {**by_id[id]._asdict(), "choices": choices_by_page.get(id, [])}
+            for id in ids
+            if id in by_id
+        ]
+    )
+
+
 @pages_bp.route("/<int:id>", methods=["GET"])
 def get_page(id):
     """GET /pages/<id> - Returns page text + choices"""
-    page = Page.query.get_or_404(id)
+    page = row_or_404(select(*PAGE_COLUMNS).where(Page.id == id))
 
-    choices = Choice.query.filter_by(page_id=page.id).all()
-
-    return jsonify(
-        {
-            "id": page.id,
-            "story_id": page.story_id,
-            "text": page.text,
-            "is_ending": page.is_ending,
-            "ending_label": page.ending_label,
-            "choices": [
-                {
-                    "id": choice.id,
-                    "text": choice.text,
-                    "next_page_id": choice.next_page_id,
-                }
-                for choice in choices
-            ],
-        }
-    )
+    choices = db.session.execute(
+        select(*CHOICE_COLUMNS).where(Choice.page_id == id).order_by(Choice.id)
+    ).all()
+
+    return respond({**page._asdict(), "choices": choices})
 
 
 @pages_bp.route("/<int:id>", methods=["PUT"])
@@ -52,6 +83,8 @@ def update_page(id):
     """PUT /pages/<id> - Update page text/ending status"""
     page = Page.query.get_or_404(id)
     data = request.get_json()
+    if "text" in data and not isinstance(data["text"], str):
+        return jsonify({"error": "text must be a string"}), 400
 
     page.text = data.get("text", page.text)
     page.is_ending = data.get("is_ending", page.is_ending)
@@ -65,10 +98,18 @@ def update_page(id):
 @pages_bp.route("/<int:id>", methods=["DELETE"])
 @require_api_key
 def delete_page(id):
-    """DELETE /pages/<id>"""
-    page = Page.query.get_or_404(id)
+    """DELETE /pages/<id> — its own choices go with it (ON DELETE CASCADE)"""
+    # Choices elsewhere that lead to this page would dangle
+    db.session.execute(
+        delete(Choice).where(Choice.next_page_id == id), execution_options=NO_SYNC
+    )
+    result = db.session.execute(
+        delete(Page).where(Page.id == id), execution_options=NO_SYNC
+    )
+    if not result.rowcount:
+        db.session.rollback()
+        abort(404)
 
-    db.session.delete(page)
     db.session.commit()
 
     return jsonify({"message": "Page deleted successfully"})
@@ -0,0 +1,20 @@
+from flask import Blueprint, abort, current_app, request
+from snapshots import load
+
+snapshots_bp = Blueprint("snapshots", __name__, url_prefix="/snapshots")
+
+# A snapshot never changes once written: let every cache keep it
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@snapshots_bp.route("/<string:content_hash>", methods=["GET"])
+def get_snapshot(content_hash):
+    """GET /snapshots/<hash> — a published story's full page graph"""
+    body = load(content_hash)
+    if body is None:
+        abort(404)
+
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(content_hash)
+    response.headers["Cache-Control"] = IMMUTABLE
+    return response.make_conditional(request)
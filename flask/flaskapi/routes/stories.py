@@ -1,13 +1,21 @@
-from flask import Blueprint, request, jsonify
-from models import Story
-from extensions import db
+from flask import Blueprint, current_app, request, jsonify, abort
+from sqlalchemy import select, update, delete, or_, true
+from models import Story, Page, Choice
+from extensions import db, row_or_404
+from serialization import respond
+import ratelimit
+import snapshots
 
 stories_bp = Blueprint("stories", __name__, url_prefix="/stories")
+stories_bp.before_request(ratelimit.limit_writes)
 
 import os
 
 API_KEY = os.environ.get("FLASK_API_KEY", "Stories")
 
+# Bulk UPDATE/DELETE statements skip syncing the identity map
+NO_SYNC = {"synchronize_session": False}
+
 
 def require_api_key(func):
     def wrapper(*args, **kwargs):
@@ -20,6 +28,24 @@ def require_api_key(func):
     return wrapper
 
 
+# Column projections for the read endpoints: they return lightweight rows,
+# ORM instances (identity map, change tracking) are only loaded for writes
+STORY_COLUMNS = (
+    Story.id,
+    Story.title,
+    Story.description,
+    Story.status,
+    Story.start_page_id,
+    Story.author_id,
+    Story.snapshot_hash,
+)
+PAGE_COLUMNS = (Page.id, Page.text, Page.is_ending, Page.ending_label)
+CHOICE_COLUMNS = (Choice.id, Choice.page_id, Choice.text, Choice.next_page_id)
+
+
+STATUSES = ("draft", "published", "suspended")
+
+
 def story_to_dict(story):
     return {
         "id": story.id,
@@ -28,6 +54,7 @@ def story_to_dict(story):
         "status": story.status,
         "start_page_id": story.start_page_id,
         "author_id": story.author_id,
+        "snapshot_hash": story.snapshot_hash,
     }
 
 
@@ -40,63 +67,67 @@ def list_stories():
     status = request.args.get("status")
     author_id = request.args.get("author_id", type=int)
 
-    query = Story.query
+    query = select(*STORY_COLUMNS)
     if status:
-        query = query.filter_by(status=status)
+        query = query.where(Story.status == status)
     if author_id is not None:
-        query = query.filter_by(author_id=author_id)
+        query = query.where(Story.author_id == author_id)
 
-    return jsonify([story_to_dict(s) for s in query.all()])
+    return respond(db.session.execute(query).all())
 
 
 @stories_bp.route("/<int:id>", methods=["GET"])
 def get_story(id):
     """GET /stories/<id>"""
-    story = Story.query.get_or_404(id)
-    return jsonify(story_to_dict(story))
+    return respond(row_or_404(select(*STORY_COLUMNS).where(Story.id == id)))
 
 
 @stories_bp.route("/<int:id>/start", methods=["GET"])
 def start_story(id):
     """GET /stories/<id>/start"""
-    story = Story.query.get_or_404(id)
-    return jsonify({"start_page_id": story.start_page_id})
+    return respond(row_or_404(select(Story.start_page_id).where(Story.id == id)))
 
 
 @stories_bp.route("/<int:id>/pages", methods=["GET", "POST"])
 def story_pages(id):
-    from models import Page, Choice
-
-    story = Story.query.get_or_404(id)
-
     if request.method == "GET":
         """GET /stories/<id>/pages — returns all pages with their choices"""
-        pages = Page.query.filter_by(story_id=story.id).all()
-        result = []
-        for page in pages:
-            choices = Choice.query.filter_by(page_id=page.id).all()
-            result.append(
+        story = row_or_404(select(Story.id, Story.start_page_id).where(Story.id == id))
+        pages = db.session.execute(
+            select(*PAGE_COLUMNS).where(Page.story_id == story.id).order_by(Page.id)
+        ).all()
+        choices = db.session.execute(
+            select(*CHOICE_COLUMNS)
+            .join(Page, Page.id == Choice.page_id)
+            .where(Page.story_id == story.id)
+            .order_by(Choice.page_id, Choice.id)
+        ).all()
+
+        choices_by_page = {}
+        for choice in choices:
+            choices_by_page.setdefault(choice.page_id, []).append(choice)
+
+        return respond(
+            [
                 {
-                    "id": page.id,
-                    "text": page.text,
-                    "is_ending": page.is_ending,
-                    "ending_label": page.ending_label,
+                    **page._asdict(),
                     "is_start": page.id == story.start_page_id,
-                    "choices": [
-                        {"id": c.id, "text": c.text, "next_page_id": c.next_page_id}
-                        for c in choices
-                    ],
+                    "choices": choices_by_page.get(page.id, []),
                 }
-            )
-        return jsonify(result)
+                for page in pages
+            ]
+        )
 
     else:  # POST
         """POST /stories/<id>/pages"""
+        story = Story.query.get_or_404(id)
         key = request.headers.get("X-API-KEY")
         if key != API_KEY:
             return jsonify({"error": "Unauthorized"}), 401
 
         data = request.get_json()
+        if not isinstance(data.get("text", ""), str):
+            return jsonify({"error": "text must be a string"}), 400
         page = Page(
             story_id=story.id,
             text=data.get("text", ""),
@@ -133,45 +164,133 @@ def create_story():
     db.session.add(story)
     db.session.commit()
 
+    if story.status == "published":
+        snapshots.publish(story.id)
+        db.session.commit()
+
     return jsonify({"message": "Story created successfully", "id": story.id}), 201
 
 
+def owned_by(requesting_author):
+    """WHERE clause for stories the requester may write.
+
+    Ownership is only enforced if both sides are set (stories created before
+    author_id was added have author_id=None — anyone may edit them).
+    """
+    if requesting_author is None:
+        return true()
+    return or_(Story.author_id.is_(None), Story.author_id == int(requesting_author))
+
+
+def write_refused(id):
+    """Explain a conditional write that matched no row: 404 or 403"""
+    db.session.rollback()
+    if db.session.execute(select(Story.id).where(Story.id == id)).first() is None:
+        abort(404)
+    return jsonify({"error": "Forbidden: you do not own this story"}), 403
+
+
 @stories_bp.route("/<int:id>", methods=["PUT"])
 @require_api_key
 def update_story(id):
-    """PUT /stories/<id>"""
-    story = Story.query.get_or_404(id)
+    """PUT /stories/<id> — single UPDATE ... WHERE id=? AND <owner>"""
     data = request.get_json()
+    where = (Story.id == id, owned_by(data.get("requesting_author_id")))
+
+    values = {
+        field: data[field]
+        for field in ("title", "description", "status", "start_page_id")
+        if field in data
+    }
+    if "status" in values and values["status"] != "published":
+        values["snapshot_hash"] = None  # readers follow the live rows again
+    if values:
+        result = db.session.execute(
+            update(Story).where(*where).values(**values), execution_options=NO_SYNC
+        )
+        matched = result.rowcount
+    else:
+        matched = db.session.execute(select(Story.id).where(*where)).first() is not None
 
-    # Ownership check: only enforce if both sides are set
-    # (stories created before author_id was added will have author_id=None — allow edit)
-    requesting_author = data.get("requesting_author_id")
-    if requesting_author is not None and story.author_id is not None:
-        if int(requesting_author) != int(story.author_id):
-            return jsonify({"error": "Forbidden: you do not own this story"}), 403
+    if not matched:
+        return write_refused(id)
 
-    story.title = data.get("title", story.title)
-    story.description = data.get("description", story.description)
-    story.status = data.get("status", story.status)
-    story.start_page_id = data.get("start_page_id", story.start_page_id)
+    # (Re)publishing freezes the current content for readers
+    if values.get("status") == "published":
+        snapshots.publish(id)
 
     db.session.commit()
     return jsonify({"message": "Story updated successfully"})
 
 
+@stories_bp.route("/status", methods=["PUT"])
+@require_api_key
+def update_statuses():
+    """PUT /stories/status {"ids": [...], "status": ...} — one UPDATE for all
+
+    For moderation: no ownership check. At most STORIES_BATCH_MAX ids.
+    Returns the ids that exist (and were updated).
+    """
+    data = request.get_json(silent=True) or {}
+    status = data.get("status")
+    if status not in STATUSES:
+        return jsonify({"error": f"status must be one of {', '.join(STATUSES)}"}), 400
+    ids = data.get("ids")
+    # Strings iterate as digits, bools are ints: accept a list of ints only
+    if not isinstance(ids, list) or not all(type(story_id) is int for story_id in ids):
+        return jsonify({"error": "ids must be a list of story ids"}), 400
+    ids = list(dict.fromkeys(ids))
+    limit = current_app.config["STORIES_BATCH_MAX"]
+    if len(ids) > limit:
+        return jsonify({"error": f"At most {limit} ids per request"}), 400
+
+    updated = db.session.scalars(
+        update(Story)
+        .where(Story.id.in_(ids))
+        .values(status=status, snapshot_hash=None)
+        .returning(Story.id),
+        execution_options=NO_SYNC,
+    ).all()
+    if status == "published":
+        for id in updated:
+            snapshots.publish(id)
+
+    db.session.commit()
+    return jsonify({"updated": sorted(updated)})
+
+
+@stories_bp.route("/<int:id>/snapshot", methods=["POST"])
+@require_api_key
+def publish_snapshot(id):
+    """POST /stories/<id>/snapshot — freeze current content for readers"""
+    data = request.get_json(silent=True) or {}
+    where = (Story.id == id, owned_by(data.get("requesting_author_id")))
+    if db.session.execute(select(Story.id).where(*where)).first() is None:
+        return write_refused(id)
+
+    content_hash = snapshots.publish(id)
+    db.session.commit()
+    return jsonify({"snapshot_hash": content_hash})
+
+
 @stories_bp.route("/<int:id>", methods=["DELETE"])
 @require_api_key
 def delete_story(id):
-    """DELETE /stories/<id>"""
-    story = Story.query.get_or_404(id)
+    """DELETE /stories/<id> — pages and choices go with it (ON DELETE CASCADE)"""
     data = request.get_json(silent=True) or {}
+    where = (Story.id == id, owned_by(data.get("requesting_author_id")))
+    owned = select(Story.id).where(*where)
+    story_pages = select(Page.id).where(Page.story_id.in_(owned))
+
+    # Choices in other stories that lead into this one would dangle
+    db.session.execute(
+        delete(Choice).where(Choice.next_page_id.in_(story_pages)),
+        execution_options=NO_SYNC,
+    )
+    result = db.session.execute(delete(Story).where(*where), execution_options=NO_SYNC)
 
-    # Ownership check
-    requesting_author = data.get("requesting_author_id")
-    if requesting_author is not None and story.author_id is not None:
-        if int(requesting_author) != story.author_id:
-            return jsonify({"error": "Forbidden: you do not own this story"}), 403
+    if not result.rowcount:
+        return write_refused(id)
 
-    db.session.delete(story)
     db.session.commit()
     return jsonify({"message": "Story deleted successfully"})
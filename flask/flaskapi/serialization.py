@@ -0,0 +1,86 @@
+from flask import Response, current_app, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.engine import Row, RowMapping
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json
+    orjson = None
+
+MSGPACK_MIMETYPE = "application/msgpack"
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+# Serialization for API responses
+# Read endpoints return SQLAlchemy Row objects straight from Core selects;
+# they are turned into JSON objects by the encoder's default hook while
+# encoding, so routes never build per-row dicts themselves.
+#
+# Content negotiation: JSON stays the default; clients that send
+# `Accept: application/msgpack` get the same payload as MessagePack
+# (when msgpack is installed).
+
+
+def to_builtin(obj):
+    """default= hook shared by every encoder: rows become column mappings"""
+    if isinstance(obj, Row):
+        return obj._asdict()
+    if isinstance(obj, RowMapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider: orjson when installed, stdlib json otherwise"""
+
+    @staticmethod
+    def default(obj):
+        try:
+            return to_builtin(obj)
+        except TypeError:
+            return DefaultJSONProvider.default(obj)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS),
+            mimetype=self.mimetype,
+        )
+
+
+def wants_msgpack():
+    if msgpack is None:
+        return False
+    best = request.accept_mimetypes.best_match(["application/json", MSGPACK_MIMETYPE])
+    return best == MSGPACK_MIMETYPE
+
+
+def respond(payload, status=200):
+    """jsonify() replacement that honours the Accept header"""
+    if wants_msgpack():
+        response = Response(
+            msgpack.packb(payload, default=to_builtin, use_bin_type=True),
+            status=status,
+            mimetype=MSGPACK_MIMETYPE,
+        )
+    else:
+        response = current_app.json.response(payload)
+        response.status_code = status
+    response.vary.add("Accept")
+    return response
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import zlib
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Story, Page, Choice, StorySnapshot
+
+# Published story snapshots
+# Publishing freezes the story's page graph into one immutable row:
+# canonical JSON (sorted keys, no whitespace), zlib-compressed, keyed by the
+# sha256 of the JSON. Story.snapshot_hash points readers at the current
+# one. Editing a published story changes the live rows only; readers keep
+# the snapshot until the story is published again; moving it out of
+# published clears the pointer. Since a hash always names the same bytes,
+# GET /snapshots/<hash> may be cached forever. Superseded snapshots are
+# deleted by `flask gc-orphans` once SNAPSHOT_GC_GRACE has passed, so
+# readers holding a just-replaced hash can still fetch it.
+
+NO_SYNC = {"synchronize_session": False}
+
+
+def build(story_id):
+    """The reader's view of a story: {"pages": {"<id>": page + choices}, ...}"""
+    story = db.session.execute(
+        select(Story.id, Story.title, Story.start_page_id).where(Story.id == story_id)
+    ).one()
+    pages = db.session.execute(
+        select(Page.id, Page.story_id, Page.text, Page.is_ending, Page.ending_label)
+        .where(Page.story_id == story_id)
+        .order_by(Page.id)
+    ).all()
+    choices = db.session.execute(
+        select(Choice.id, Choice.page_id, Choice.text, Choice.next_page_id)
+        .join(Page, Page.id == Choice.page_id)
+        .where(Page.story_id == story_id)
+        .order_by(Choice.id)
+    ).all()
+
+    graph = {str(page.id): {**page._asdict(), "choices": []} for page in pages}
+    for choice in choices:
+        graph[str(choice.page_id)]["choices"].append(choice._asdict())
+
+    return {
+        "story_id": story.id,
+        "title": story.title,
+        "start_page_id": story.start_page_id,
+        "pages": graph,
+    }
+
+
+def encode(snapshot):
+    """Canonical JSON bytes: same content, same bytes, same hash"""
+    return json.dumps(
+        snapshot, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode()
+
+
+def publish(story_id):
+    """Freeze the story's current content and point readers at it.
+
+    Returns the content hash. Publishing unchanged content reuses the
+    existing snapshot. The caller commits.
+    """
+    body = encode(build(story_id))
+    content_hash = hashlib.sha256(body).hexdigest()
+
+    exists = db.session.execute(
+        select(StorySnapshot.id).where(StorySnapshot.content_hash == content_hash)
+    ).first()
+    if exists is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(
+                    StorySnapshot(
+                        story_id=story_id,
+                        content_hash=content_hash,
+                        data=zlib.compress(body, 9),
+                    )
+                )
+        except IntegrityError:
+            pass  # published concurrently with identical content
+
+    db.session.execute(
+        update(Story).where(Story.id == story_id).values(snapshot_hash=content_hash),
+        execution_options=NO_SYNC,
+    )
+    return content_hash
+
+
+def load(content_hash):
+    """Uncompressed JSON bytes of a snapshot, or None"""
+    data = db.session.execute(
+        select(StorySnapshot.data).where(StorySnapshot.content_hash == content_hash)
+    ).scalar()
+    return zlib.decompress(data) if data is not None else None
@@ -0,0 +1,75 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+FLASKAPI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLASKAPI_DIR)
+
+from flask_migrate import upgrade
+from sqlalchemy import text
+
+from app import create_app
+from config import Config
+from extensions import db
+
+# Every test runs against a fresh SQLite file migrated with `flask db
+# upgrade`, and again against PostgreSQL when TEST_POSTGRES_URL points at a
+# scratch database (its tables are dropped after each test). Replica tests
+# use two SQLite files: the primary and a copy of it as the "replica" bind.
+
+MIGRATIONS_DIR = os.path.join(FLASKAPI_DIR, "migrations")
+
+
+def make_config(database_url, binds=None):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_BINDS = binds or {}
+
+    return TestConfig
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def database_url(request, tmp_path):
+    if request.param == "sqlite":
+        return f"sqlite:///{tmp_path / 'stories.db'}"
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    return url
+
+
+@pytest.fixture
+def app(database_url):
+    app = create_app(make_config(database_url))
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+        yield app
+        db.session.remove()
+        if db.engine.dialect.name != "sqlite":
+            db.drop_all()
+            with db.engine.begin() as connection:
+                connection.execute(text("DROP TABLE alembic_version"))
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    app = create_app(
+        make_config(f"sqlite:///{primary}", {"replica": f"sqlite:///{replica}"})
+    )
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+        shutil.copy(primary, replica)
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
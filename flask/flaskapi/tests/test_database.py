@@ -0,0 +1,133 @@
+import pytest
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.exc import IntegrityError
+
+from config import engine_options, normalize_url
+from extensions import db
+from models import Choice, Page, Story
+from routes.stories import API_KEY
+
+API_HEADERS = {"X-API-KEY": API_KEY}
+
+
+def make_story(pages=3):
+    """A story whose pages each lead to the next one"""
+    story = Story(title="Story", description="A story", status="published")
+    db.session.add(story)
+    db.session.flush()
+    page_ids = []
+    for n in range(pages):
+        page = Page(story_id=story.id, text=f"Page {n}", is_ending=n == pages - 1)
+        db.session.add(page)
+        db.session.flush()
+        page_ids.append(page.id)
+    for page_id, next_page_id in zip(page_ids, page_ids[1:]):
+        db.session.add(Choice(page_id=page_id, text="Next", next_page_id=next_page_id))
+    db.session.commit()
+    return story.id, page_ids
+
+
+def count(model):
+    return db.session.scalar(select(func.count()).select_from(model))
+
+
+def test_sqlite_foreign_keys_enabled(app):
+    if db.engine.dialect.name != "sqlite":
+        pytest.skip("SQLite only")
+    assert db.session.execute(text("PRAGMA foreign_keys")).scalar() == 1
+
+
+def test_foreign_keys_enforced(app):
+    db.session.add(Page(story_id=12345, text="Nowhere"))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+
+
+def test_deleting_a_story_row_cascades_to_pages_and_choices(app):
+    story_id, _ = make_story()
+    other_story_id, _ = make_story()
+
+    db.session.execute(delete(Story).where(Story.id == story_id))
+    db.session.commit()
+
+    assert db.session.scalars(select(Page.story_id).distinct()).all() == [
+        other_story_id
+    ]
+    assert count(Choice) == 2
+
+
+def test_deleting_a_page_row_cascades_to_its_choices(app):
+    _, page_ids = make_story()
+
+    db.session.execute(delete(Page).where(Page.id == page_ids[0]))
+    db.session.commit()
+
+    assert db.session.scalars(select(Choice.page_id)).all() == [page_ids[1]]
+
+
+def test_delete_story_endpoint(app, client):
+    story_id, _ = make_story()
+
+    response = client.delete(f"/stories/{story_id}", headers=API_HEADERS)
+
+    assert response.status_code == 200
+    assert count(Story) == count(Page) == count(Choice) == 0
+
+
+def test_delete_page_endpoint_removes_choices_leading_to_it(app, client):
+    _, page_ids = make_story()
+
+    response = client.delete(f"/pages/{page_ids[1]}", headers=API_HEADERS)
+
+    assert response.status_code == 200
+    assert count(Page) == 2
+    assert count(Choice) == 0
+
+
+def test_normalize_url():
+    assert normalize_url("postgres://u:p@host/db") == "postgresql://u:p@host/db"
+    assert normalize_url("sqlite:///stories.db") == "sqlite:///stories.db"
+
+
+def test_engine_options_from_environment(monkeypatch):
+    assert "pool_size" not in engine_options()
+
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "0")
+    options = engine_options()
+
+    assert options["pool_size"] == 7
+    assert options["pool_pre_ping"] is False
+
+
+def test_page_text_must_be_a_string(app, client):
+    story_id, page_ids = make_story()
+
+    created = client.post(
+        f"/stories/{story_id}/pages", json={"text": None}, headers=API_HEADERS
+    )
+    updated = client.put(
+        f"/pages/{page_ids[0]}", json={"text": 12}, headers=API_HEADERS
+    )
+
+    assert created.status_code == updated.status_code == 400
+    assert count(Page) == 3
+
+
+def test_update_statuses_takes_a_list_of_ids(app, client):
+    story_id, _ = make_story()
+
+    for ids in ("12", [str(story_id)], [True], [1.5], None, {"1": 1}):
+        response = client.put(
+            "/stories/status",
+            json={"ids": ids, "status": "suspended"},
+            headers=API_HEADERS,
+        )
+        assert response.status_code == 400, ids
+
+    response = client.put(
+        "/stories/status",
+        json={"ids": [story_id, story_id], "status": "suspended"},
+        headers=API_HEADERS,
+    )
+    assert response.get_json() == {"updated": [story_id]}
@@ -0,0 +1,51 @@
+from unittest import mock
+
+import pytest
+
+from ratelimit import LocalStore
+from routes.stories import API_KEY
+
+
+def test_bucket_refills_over_time():
+    store = LocalStore()
+    with mock.patch("ratelimit.time.monotonic", return_value=100.0):
+        assert store.take("a", capacity=2, per_second=0.5) == 0
+        assert store.take("a", capacity=2, per_second=0.5) == 0
+        assert store.take("a", capacity=2, per_second=0.5) == pytest.approx(2)
+        assert store.take("b", capacity=2, per_second=0.5) == 0
+    with mock.patch("ratelimit.time.monotonic", return_value=101.0):
+        assert store.take("a", capacity=2, per_second=0.5) == pytest.approx(1)
+    with mock.patch("ratelimit.time.monotonic", return_value=103.0):
+        assert store.take("a", capacity=2, per_second=0.5) == 0
+
+
+def test_bucket_never_holds_more_than_its_capacity():
+    store = LocalStore()
+    with mock.patch("ratelimit.time.monotonic", return_value=0.0):
+        store.take("a", capacity=1, per_second=1)
+    with mock.patch("ratelimit.time.monotonic", return_value=1000.0):
+        assert store.take("a", capacity=1, per_second=1) == 0
+        assert store.take("a", capacity=1, per_second=1) == pytest.approx(1)
+
+
+def test_least_recently_used_buckets_are_dropped():
+    store = LocalStore(stripes=1, max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        store.take(key, capacity=5, per_second=1)
+
+    assert list(store._buckets[0]) == ["a", "c"]
+
+
+def test_writes_are_limited_per_client(app, client):
+    app.config.update(RATE_LIMIT_CAPACITY=1, RATE_LIMIT_PER_SECOND=0.001)
+    app.extensions["ratelimit"] = LocalStore()
+
+    def create(client_id):
+        headers = {"X-API-KEY": API_KEY, "X-Client-Id": client_id}
+        return client.post("/stories", json={"title": "Story"}, headers=headers)
+
+    assert create("user:1").status_code == 201
+    limited = create("user:1")
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) > 0
+    assert create("user:2").status_code == 201
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import insert, select
+
+from extensions import READ_PRIMARY_HEADER, REPLICA_BIND, db
+from models import Story
+from routes.stories import API_KEY
+
+
+@pytest.fixture
+def client(replica_app):
+    """Primary and replica each hold one story, named after the database"""
+    for bind in (None, REPLICA_BIND):
+        with db.engines[bind].begin() as connection:
+            connection.execute(
+                insert(Story).values(
+                    title=bind or "primary", description="", status="published"
+                )
+            )
+    return replica_app.test_client()
+
+
+def titles(engine):
+    with engine.connect() as connection:
+        return connection.scalars(select(Story.title).order_by(Story.id)).all()
+
+
+def test_get_reads_from_the_replica(client):
+    response = client.get("/stories")
+
+    assert [story["title"] for story in response.get_json()] == ["replica"]
+
+
+def test_read_primary_header_reads_from_the_primary(client):
+    response = client.get("/stories", headers={READ_PRIMARY_HEADER: "1"})
+
+    assert [story["title"] for story in response.get_json()] == ["primary"]
+
+
+def test_writes_go_to_the_primary(client):
+    response = client.post(
+        "/stories",
+        json={"title": "new", "description": "", "status": "draft"},
+        headers={"X-API-KEY": API_KEY},
+    )
+
+    assert response.status_code == 201
+    assert titles(db.engines[None]) == ["primary", "new"]
+    assert titles(db.engines[REPLICA_BIND]) == ["replica"]
+
+
+def test_outside_requests_read_from_the_primary(client):
+    assert db.session.scalars(select(Story.title)).all() == ["primary"]
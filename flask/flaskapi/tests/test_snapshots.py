@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+from commands import gc_orphans
+from extensions import db
+from models import Page, Story, StorySnapshot
+from routes.stories import API_KEY
+
+API_HEADERS = {"X-API-KEY": API_KEY}
+
+
+def make_story(client, status="published"):
+    """A one-page story created through the API; returns (story id, page id)"""
+    story_id = client.post(
+        "/stories", json={"title": "Story", "status": "draft"}, headers=API_HEADERS
+    ).get_json()["id"]
+    page_id = client.post(
+        f"/stories/{story_id}/pages",
+        json={"text": "Once upon a time", "is_start_page": True},
+        headers=API_HEADERS,
+    ).get_json()["id"]
+    client.put(f"/stories/{story_id}", json={"status": status}, headers=API_HEADERS)
+    return story_id, page_id
+
+
+def snapshot_hash(story_id):
+    return db.session.scalar(select(Story.snapshot_hash).where(Story.id == story_id))
+
+
+def test_snapshot_is_not_changed_by_later_edits(app, client):
+    story_id, page_id = make_story(client)
+    published = snapshot_hash(story_id)
+    before = client.get(f"/snapshots/{published}")
+
+    client.put(f"/pages/{page_id}", json={"text": "Edited"}, headers=API_HEADERS)
+
+    after = client.get(f"/snapshots/{published}")
+    assert after.status_code == 200
+    assert after.data == before.data
+    assert after.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert snapshot_hash(story_id) == published
+
+
+def test_republishing_freezes_a_new_snapshot(app, client):
+    story_id, page_id = make_story(client)
+    published = snapshot_hash(story_id)
+
+    client.put(f"/pages/{page_id}", json={"text": "Edited"}, headers=API_HEADERS)
+    client.put(
+        f"/stories/{story_id}", json={"status": "published"}, headers=API_HEADERS
+    )
+
+    republished = snapshot_hash(story_id)
+    assert republished != published
+    pages = client.get(f"/snapshots/{republished}").get_json()["pages"]
+    assert pages[str(page_id)]["text"] == "Edited"
+    assert client.get(f"/snapshots/{published}").status_code == 200
+
+
+def test_missing_snapshot_is_404(app, client):
+    response = client.get(f"/snapshots/{'0' * 64}")
+
+    assert response.status_code == 404
+
+
+def test_leaving_published_clears_the_snapshot(app, client):
+    story_id, _ = make_story(client)
+    other_id, _ = make_story(client)
+
+    client.put(f"/stories/{story_id}", json={"status": "draft"}, headers=API_HEADERS)
+    client.put(
+        "/stories/status",
+        json={"ids": [other_id], "status": "suspended"},
+        headers=API_HEADERS,
+    )
+
+    assert snapshot_hash(story_id) is None
+    assert snapshot_hash(other_id) is None
+
+
+def test_gc_deletes_old_snapshots_no_story_points_at(app, client):
+    story_id, page_id = make_story(client)
+    client.put(f"/pages/{page_id}", json={"text": "Edited"}, headers=API_HEADERS)
+    client.put(
+        f"/stories/{story_id}", json={"status": "published"}, headers=API_HEADERS
+    )
+    client.put(f"/pages/{page_id}", json={"text": "Again"}, headers=API_HEADERS)
+    client.put(
+        f"/stories/{story_id}", json={"status": "published"}, headers=API_HEADERS
+    )
+    first, second = db.session.scalars(
+        select(StorySnapshot.content_hash).order_by(StorySnapshot.id).limit(2)
+    ).all()
+    current = snapshot_hash(story_id)
+    # The first and the current snapshot are past the grace period
+    grace = timedelta(seconds=app.config["SNAPSHOT_GC_GRACE"] + 60)
+    old = datetime.now(timezone.utc).replace(tzinfo=None) - grace
+    db.session.execute(
+        update(StorySnapshot)
+        .where(StorySnapshot.content_hash.in_([first, current]))
+        .values(created_at=old)
+    )
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(gc_orphans)
+
+    assert result.exit_code == 0, result.output
+    remaining = db.session.scalars(select(StorySnapshot.content_hash)).all()
+    assert sorted(remaining) == sorted([second, current])
+    assert db.session.scalar(select(Page.text).where(Page.id == page_id)) == "Again"
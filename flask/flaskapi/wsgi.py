@@ -0,0 +1,5 @@
+"""WSGI entry point for production servers: gunicorn -c gunicorn.conf.py"""
+
+from app import app
+
+application = app